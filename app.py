@@ -1,19 +1,37 @@
 # app.py - VR實測效率查詢系統
-from flask import Flask, request, jsonify, render_template, send_file, session, abort, redirect, url_for, make_response
+from flask import Flask, request, jsonify, render_template, session, abort, redirect, url_for, make_response, g, has_app_context
 from flask_socketio import SocketIO, emit, join_room
+from socketio import PubSubManager
 import sqlite3
-import pandas as pd
+import numpy as np
 import json
 import os
 import shutil
 from datetime import datetime
 from functools import wraps
 import io
+import sys
 import csv
+import gzip
+from array import array
+from itertools import groupby
+from operator import itemgetter
+from bisect import bisect_left
+import time
+import hashlib
+import threading
+from collections import OrderedDict, deque
+import base64
+import zipfile
+import zlib
+import tempfile
+import uuid
+import re
+import logging
+import click
 
 app = Flask(__name__)
 app.secret_key = 'vr-efficiency-system-secret-key'
-socketio = SocketIO(app, cors_allowed_origins="*")
 
 ADMIN_PASSWORD = "admin123"  # 生產環境請更改此密碼
 
@@ -26,11 +44,696 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-# 資料庫初始化
-def init_db():
-    conn = sqlite3.connect('data/vr_efficiency.sqlite')
-    cursor = conn.cursor()
+# 資料庫路徑，可由環境變數 VR_DB_PATH 指定
+app.config['DB_PATH'] = os.environ.get('VR_DB_PATH', os.path.join('data', 'vr_efficiency.sqlite'))
+# 請求內容的大小上限（MB），超過時在讀取表單之前回傳 413；還原的備份檔也受此限制
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('VR_MAX_REQUEST_MB', 1024)) * 1024 * 1024
+
+@app.errorhandler(413)
+def request_too_large(error):
+    return jsonify({'error': f'上傳內容超過 {app.config["MAX_CONTENT_LENGTH"] // (1024 * 1024)} MB 的上限'}), 413
+# 等待其他連線釋放寫入鎖的時間（毫秒），避免上傳時出現 "database is locked"
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('VR_DB_BUSY_TIMEOUT_MS', 10000))
+
+# Socket.IO 訊息佇列：多個 worker 時，事件經由佇列送到所有 worker 上的客戶端
+# sqlite:///路徑 使用下面以 SQLite 檔案實作的佇列，其他 URL（例如 redis://）交給 Flask-SocketIO
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('VR_SOCKETIO_MESSAGE_QUEUE')
+SOCKETIO_QUEUE_POLL_MS = int(os.environ.get('VR_SOCKETIO_QUEUE_POLL_MS', 50))
+# 佇列中的訊息保留秒數，超過的在下次發送時刪除
+SOCKETIO_QUEUE_RETENTION_S = 60
+
+# 同一台主機上的 worker 共用的 SQLite 訊息佇列，不需另外架設 Redis，也用於測試與負載測試
+class SQLiteQueueManager(PubSubManager):
+    name = 'sqlite'
+
+    def __init__(self, url, channel='flask-socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = url[len('sqlite:///'):]
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS socketio_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                created REAL NOT NULL,
+                payload TEXT NOT NULL
+            )
+        ''')
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        conn.execute('PRAGMA journal_mode = WAL')
+        return conn
+
+    def _publish(self, data):
+        conn = self._connect()
+        try:
+            now = time.time()
+            conn.execute('INSERT INTO socketio_messages (channel, created, payload) VALUES (?, ?, ?)',
+                         (self.channel, now, json.dumps(data)))
+            conn.execute('DELETE FROM socketio_messages WHERE created < ?', (now - SOCKETIO_QUEUE_RETENTION_S,))
+        finally:
+            conn.close()
+
+    def _listen(self):
+        # 只接收啟動之後的訊息；AUTOINCREMENT 保證 id 依寫入順序遞增且不重複使用
+        conn = self._connect()
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM socketio_messages').fetchone()[0]
+        while True:
+            rows = conn.execute('SELECT id, payload FROM socketio_messages WHERE channel = ? AND id > ? ORDER BY id',
+                                (self.channel, last_id)).fetchall()
+            for last_id, payload in rows:
+                yield payload
+            self.server.sleep(SOCKETIO_QUEUE_POLL_MS / 1000)
+
+socketio_options = {'cors_allowed_origins': '*'}
+if SOCKETIO_MESSAGE_QUEUE:
+    # gunicorn 無法把同一個客戶端的 long-polling 請求固定送到同一個 worker，多 worker 時只使用 WebSocket
+    socketio_options['transports'] = ['websocket']
+    if SOCKETIO_MESSAGE_QUEUE.startswith('sqlite:///'):
+        socketio_options['client_manager'] = SQLiteQueueManager(SOCKETIO_MESSAGE_QUEUE)
+    else:
+        socketio_options['message_queue'] = SOCKETIO_MESSAGE_QUEUE
+socketio = SocketIO(app, **socketio_options)
+
+# 背景工作在原生執行緒中執行（見 run_job），與請求共用的鎖必須是原生的鎖：monkey patch 後的 threading.Lock
+# 是 green lock，在 hub 以外的執行緒中等待時無法被喚醒。使用這些鎖的臨界區都不會讓出，hub 上的等待很短
+def native_lock():
+    if socketio.async_mode == 'eventlet':
+        from eventlet.patcher import original
+        return original('threading').Lock()
+    return threading.Lock()
+
+
+# 請求量測：各路由的延遲分布、SQLite 查詢次數 / 時間 / 回傳列數與回應大小，由 /metrics 以 Prometheus 文字格式輸出
+# VR_METRICS=0 時不量測 SQLite 查詢（仍記錄請求延遲）
+METRICS_SQL_ENABLED = os.environ.get('VR_METRICS', '1') != '0'
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# 慢查詢記錄：單一 SQL（執行加讀取結果）超過 VR_SLOW_QUERY_MS 毫秒時記下 SQL 與參數，0 表示關閉
+# 預設寫到 stderr，設定 VR_SLOW_QUERY_LOG 時另外寫入該檔案
+SLOW_QUERY_MS = float(os.environ.get('VR_SLOW_QUERY_MS', 0))
+slow_query_logger = logging.getLogger('vr_efficiency.slow_query')
+if os.environ.get('VR_SLOW_QUERY_LOG'):
+    slow_query_logger.addHandler(logging.FileHandler(os.environ['VR_SLOW_QUERY_LOG']))
+
+metrics_lock = native_lock()
+# (路由, method, 狀態碼) -> 請求數
+request_counts = {}
+# (路由, method) -> [各 bucket 的累計數..., 總秒數, 請求數]
+request_latency = {}
+# 路由 -> [SQL 數, SQL 秒數, 回傳列數, 回應位元組]
+route_totals = {}
+socketio_client_count = 0
+
+# 計時並計數的 cursor：累計到執行 SQL 時所屬請求的 g.sql_stats（[SQL 數, 秒數, 列數]），並檢查慢查詢
+# 串流回應在請求結束後才讀取結果、甚至才執行 SQL，因此在 execute 時記下 stats，沒有 app context 時改用連線建立時的請求
+class InstrumentedCursor(sqlite3.Cursor):
+    _statement = None
+    _stats = None
+    _elapsed = 0.0
+    _logged = False
+
+    def _record(self, start, rows=0, query=False):
+        elapsed = time.perf_counter() - start
+        self._elapsed += elapsed
+        stats = self._stats
+        if stats is not None:
+            stats[0] += query
+            stats[1] += elapsed
+            stats[2] += rows
+        if SLOW_QUERY_MS and not self._logged and self._elapsed * 1000 >= SLOW_QUERY_MS:
+            self._logged = True
+            sql, parameters = self._statement
+            slow_query_logger.warning('slow query %.1f ms: %s params=%r', self._elapsed * 1000,
+                                      ' '.join(sql.split()), parameters)
+
+    def _start(self, sql, parameters):
+        self._statement = (sql, parameters)
+        self._elapsed = 0.0
+        self._logged = False
+        self._stats = g.get('sql_stats') if has_app_context() else self.connection.stats
+        return time.perf_counter()
+
+    def execute(self, sql, parameters=()):
+        start = self._start(sql, parameters)
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record(start, query=True)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = self._start(sql, '(executemany)')
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record(start, query=True)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._record(start, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._record(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._record(start, len(rows))
+        return rows
+
+    # 逐列走訪時改為分批讀取，避免每列都經過 Python 的計時
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(256)
+            if not rows:
+                return
+            yield from rows
+
+class InstrumentedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = g.get('sql_stats') if has_app_context() else None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def metrics_route():
+    return request.url_rule.rule if request.url_rule else '(unmatched)'
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.sql_stats = [0, 0.0, 0]
+
+def add_route_totals(route, queries=0, seconds=0.0, rows=0, size=0):
+    with metrics_lock:
+        totals = route_totals.setdefault(route, [0, 0.0, 0, 0])
+        totals[0] += queries
+        totals[1] += seconds
+        totals[2] += rows
+        totals[3] += size
+
+# 串流回應在送完之後才知道大小，送出期間讀取的 SQL 結果也在這時才計入
+def count_streamed_bytes(route, body, stats):
+    queries, seconds, rows = stats
+    size = 0
+    try:
+        for chunk in body:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            size += len(chunk)
+            yield chunk
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+        add_route_totals(route, stats[0] - queries, stats[1] - seconds, stats[2] - rows, size)
+
+# 在 compress_response 之前註冊，因此會在其之後執行，記錄的是壓縮後的大小
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = metrics_route()
+    stats = g.get('sql_stats', [0, 0.0, 0])
+    queries, seconds, rows = stats
+    size = 0
+    if response.is_streamed and not response.direct_passthrough:
+        response.response = count_streamed_bytes(route, response.response, stats)
+    else:
+        size = response.calculate_content_length() or 0
+    with metrics_lock:
+        key = (route, request.method, response.status_code)
+        request_counts[key] = request_counts.get(key, 0) + 1
+        histogram = request_latency.setdefault((route, request.method), [0] * (len(METRICS_LATENCY_BUCKETS) + 2))
+        for index, bound in enumerate(METRICS_LATENCY_BUCKETS):
+            if elapsed <= bound:
+                histogram[index] += 1
+        histogram[-2] += elapsed
+        histogram[-1] += 1
+    add_route_totals(route, queries, seconds, rows, size)
+    return response
+
+def metric_labels(**labels):
+    escaped = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for name, value in labels.items())
+    return '{' + ','.join(escaped) + '}'
+
+def render_metrics():
+    lines = []
+    def metric(name, kind, description, samples):
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(f'{sample_name}{labels} {value}' for sample_name, labels, value in samples)
+
+    with metrics_lock:
+        metric('vr_http_requests_total', 'counter', 'HTTP requests by route, method and status.',
+               [('vr_http_requests_total', metric_labels(route=route, method=method, status=status), count)
+                for (route, method, status), count in sorted(request_counts.items())])
+        samples = []
+        for (route, method), histogram in sorted(request_latency.items()):
+            for bound, count in zip(METRICS_LATENCY_BUCKETS, histogram):
+                samples.append(('vr_http_request_duration_seconds_bucket',
+                                metric_labels(route=route, method=method, le=bound), count))
+            samples.append(('vr_http_request_duration_seconds_bucket',
+                            metric_labels(route=route, method=method, le='+Inf'), histogram[-1]))
+            samples.append(('vr_http_request_duration_seconds_sum', metric_labels(route=route, method=method),
+                            round(histogram[-2], 6)))
+            samples.append(('vr_http_request_duration_seconds_count', metric_labels(route=route, method=method),
+                            histogram[-1]))
+        metric('vr_http_request_duration_seconds', 'histogram', 'Time spent handling requests (until the response '
+               'is returned; streamed bodies are not included).', samples)
+        for index, (name, description) in enumerate((
+                ('vr_sqlite_queries_total', 'SQLite statements executed while handling requests.'),
+                ('vr_sqlite_query_seconds_total', 'Time spent executing SQLite statements and fetching their rows.'),
+                ('vr_sqlite_rows_total', 'Rows fetched from SQLite.'),
+                ('vr_http_response_bytes_total', 'Response body bytes sent (after compression).'))):
+            metric(name, 'counter', description,
+                   [(name, metric_labels(route=route), round(totals[index], 6))
+                    for route, totals in sorted(route_totals.items())])
+        metric('vr_socketio_clients', 'gauge', 'Connected Socket.IO clients on this worker.',
+               [('vr_socketio_clients', '', socketio_client_count)])
+    return '\n'.join(lines) + '\n'
+
+# 開啟資料庫連線並套用效能相關的 PRAGMA
+def connect_db():
+    conn = sqlite3.connect(app.config['DB_PATH'], timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                           factory=InstrumentedConnection if METRICS_SQL_ENABLED else sqlite3.Connection)
+    conn.execute(f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}')
+    # WAL 模式下 NORMAL 即可保證一致性，且每次 commit 不需 fsync
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA cache_size = -32000')
+    conn.execute('PRAGMA mmap_size = 268435456')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.create_function('packed_curve_in_range', 6, packed_curve_in_range, deterministic=True)
+    return conn
+
+# 取得目前請求共用的資料庫連線（存放於 Flask g，同一請求內重複使用）
+def get_db():
+    if 'db' not in g:
+        g.db = connect_db()
+    return g.db
+
+# 請求結束時關閉連線，未 commit 的交易會被回復
+@app.teardown_appcontext
+def close_db(exception):
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close()
+
+# 資料庫所在目錄（備份檔也存放在此）
+def get_data_dir():
+    return os.path.dirname(os.path.abspath(app.config['DB_PATH']))
+
+# 資料版本：每次資料異動（上傳、刪除、修改、還原、欄位增減）在同一個交易內遞增
+# 存放在資料庫中，多個 worker 也能看到一致的版本
+def get_data_version(conn):
+    row = conn.execute("SELECT value FROM app_meta WHERE key = 'data_version'").fetchone()
+    return row[0] if row else 0
+
+def bump_data_version(conn, at_least=0):
+    conn.execute('''
+        UPDATE app_meta SET value = MAX(value, ?) + 1 WHERE key = 'data_version'
+    ''', (at_least,))
+
+# 程序內的查詢結果快取（LRU + TTL），以筆數與總位元組數限制大小
+class QueryCache:
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = native_lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, size, value = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key)[1]
+
+query_cache = QueryCache(
+    max_entries=int(os.environ.get('VR_CACHE_MAX_ENTRIES', 256)),
+    max_bytes=int(os.environ.get('VR_CACHE_MAX_MB', 64)) * 1024 * 1024,
+    ttl=int(os.environ.get('VR_CACHE_TTL', 600))
+)
+
+# 回應壓縮：大於 GZIP_MIN_BYTES 的 JSON / CSV 回應以 gzip 傳送
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+GZIP_MIMETYPES = ('application/json', 'text/csv')
+
+def accepts_gzip():
+    return 'gzip' in request.accept_encodings
 
+@app.after_request
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in GZIP_MIMETYPES or not accepts_gzip()):
+        return response
+    body = response.get_data()
+    if len(body) < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+# 程式版本：未設定 VR_BUILD_ID 時以 app.py 的內容雜湊代替，部署新版本後回應格式改變也不會沿用舊的 ETag
+def compute_build_id():
+    with open(__file__, 'rb') as source:
+        return hashlib.sha1(source.read()).hexdigest()[:12]
+
+BUILD_ID = os.environ.get('VR_BUILD_ID') or compute_build_id()
+
+# 快取 GET API 的回應，並以 ETag 支援瀏覽器的 If-None-Match（回傳 304）
+# 快取鍵包含程式版本、端點、排序後的查詢參數與資料版本，資料異動或部署新版本後自動失效
+def cached_response(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = (BUILD_ID, request.endpoint, tuple(sorted(kwargs.items())),
+               tuple(sorted(request.args.items(multi=True))), get_data_version(get_db()))
+        etag = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        # gzip 與未壓縮的內容使用同一個 ETag，因此為弱 ETag
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            cached = query_cache.get(key)
+            if cached is None:
+                response = make_response(f(*args, **kwargs))
+                # 只快取成功的回應
+                if response.status_code != 200:
+                    return response
+                # [原始內容, mimetype, gzip 壓縮內容（第一次需要時才產生）]
+                cached = [response.get_data(), response.mimetype, None]
+                query_cache.set(key, cached, len(cached[0]))
+            if accepts_gzip() and len(cached[0]) >= GZIP_MIN_BYTES:
+                if cached[2] is None:
+                    cached[2] = gzip.compress(cached[0], compresslevel=GZIP_LEVEL)
+                response = app.response_class(cached[2], mimetype=cached[1])
+                response.headers['Content-Encoding'] = 'gzip'
+            else:
+                response = app.response_class(cached[0], mimetype=cached[1])
+        response.vary.add('Accept-Encoding')
+        response.set_etag(etag, weak=True)
+        # 瀏覽器每次都需重新驗證，資料未變時只會收到 304
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return decorated_function
+
+# 可用全文索引查詢的文字欄位
+SEARCH_TEXT_COLUMNS = ('powerstage_name', 'pcb_name')
+# trigram 索引至少需要 3 個字元，較短的關鍵字改用 LIKE
+SEARCH_INDEX_MIN_CHARS = 3
+
+# 建立 information_fts（FTS5 trigram，external content 指向 information_table）與同步觸發器
+# SQLite 不支援 trigram 或欄位已被移除時不建立，查詢會改用 LIKE
+def ensure_search_index(conn):
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(information_table)')}
+    if not set(SEARCH_TEXT_COLUMNS) <= columns:
+        conn.execute('DROP TABLE IF EXISTS information_fts')
+        return
+    exists = has_search_index(conn)
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS information_fts USING fts5(
+                powerstage_name, pcb_name,
+                content='information_table', content_rowid='user_ID', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        app.logger.info(f'無法建立全文索引，搜尋改用 LIKE: {e}')
+        return
+    # 重建 information_table 時觸發器會一併被刪除，因此每次都確認
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS information_fts_insert AFTER INSERT ON information_table BEGIN
+            INSERT INTO information_fts(rowid, powerstage_name, pcb_name)
+            VALUES (new.user_ID, new.powerstage_name, new.pcb_name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS information_fts_delete AFTER DELETE ON information_table BEGIN
+            INSERT INTO information_fts(information_fts, rowid, powerstage_name, pcb_name)
+            VALUES ('delete', old.user_ID, old.powerstage_name, old.pcb_name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS information_fts_update
+        AFTER UPDATE OF user_ID, powerstage_name, pcb_name ON information_table BEGIN
+            INSERT INTO information_fts(information_fts, rowid, powerstage_name, pcb_name)
+            VALUES ('delete', old.user_ID, old.powerstage_name, old.pcb_name);
+            INSERT INTO information_fts(rowid, powerstage_name, pcb_name)
+            VALUES (new.user_ID, new.powerstage_name, new.pcb_name);
+        END
+    ''')
+    if not exists:
+        conn.execute("INSERT INTO information_fts(information_fts) VALUES ('rebuild')")
+
+def has_search_index(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'information_fts'"
+    ).fetchone() is not None
+
+# 背景工作：帶 async=1 的請求立即回傳 job_id（202），原本的處理在原生執行緒中執行（eventlet 為 tpool），
+# 解析、雜湊與 SQLite 的 C 呼叫不會讓出，放在 hub 上會擋住同一個 worker 的所有請求
+# 進度與結果以 job_progress / job_completed 事件送到 job_<id> 房間，也可查詢 /api/jobs/<id>
+JOB_HISTORY = int(os.environ.get('VR_JOB_HISTORY', 200))
+# 執行中的工作每隔多久由 hub 送出一次累積的進度
+JOB_PROGRESS_INTERVAL_S = float(os.environ.get('VR_JOB_PROGRESS_INTERVAL_MS', 100)) / 1000
+# job_id -> 工作執行緒回報、尚未送出的進度（deque 的 append / popleft 可跨執行緒使用）
+job_progress_updates = {}
+# 工作狀態保存在資料目錄下的 SQLite 檔案（與 Socket.IO 佇列相同的做法），多 worker 時任何 worker 都能查詢
+# 不放在資料庫中：不隨備份 / 還原變動，回報進度時也不需等待資料的寫入交易
+JOBS_DB_NAME = 'jobs.sqlite'
+JOB_FIELDS = ('id', 'kind', 'status', 'progress', 'message', 'result', 'created_at', 'finished_at')
+
+# 由 /admin/* 啟動的工作：狀態與結果（備份的 download_url、還原訊息、欄位刪除與合併報告）只提供給管理者
+ADMIN_JOB_KINDS = ('backup', 'restore', 'remove_column', 'dedupe')
+
+def job_room(job_id):
+    return f'job_{job_id}'
+
+def can_view_job(job):
+    return job['kind'] not in ADMIN_JOB_KINDS or bool(session.get('is_admin'))
+
+def connect_jobs_db():
+    conn = sqlite3.connect(os.path.join(get_data_dir(), JOBS_DB_NAME), timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                           isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress REAL,
+            message TEXT,
+            result TEXT,
+            created_at TEXT NOT NULL,
+            finished_at TEXT
+        )
+    ''')
+    return conn
+
+def load_job(conn, job_id):
+    row = conn.execute(f'SELECT {", ".join(JOB_FIELDS)} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(zip(JOB_FIELDS, row))
+    job['result'] = json.loads(job['result']) if job['result'] is not None else None
+    return job
+
+def get_job_state(job_id):
+    conn = connect_jobs_db()
+    try:
+        return load_job(conn, job_id)
+    finally:
+        conn.close()
+
+def update_job(job_id, **fields):
+    if 'result' in fields:
+        fields['result'] = json.dumps(fields['result'])
+    conn = connect_jobs_db()
+    try:
+        conn.execute(f'UPDATE jobs SET {", ".join(f"{name} = ?" for name in fields)} WHERE id = ?',
+                     (*fields.values(), job_id))
+        return load_job(conn, job_id)
+    finally:
+        conn.close()
+
+def create_job(kind):
+    job = {
+        'id': uuid.uuid4().hex,
+        'kind': kind,
+        'status': 'queued',
+        'progress': 0,
+        'message': None,
+        'result': None,
+        'created_at': datetime.now().isoformat(),
+        'finished_at': None
+    }
+    conn = connect_jobs_db()
+    try:
+        conn.execute(f'INSERT INTO jobs ({", ".join(JOB_FIELDS)}) VALUES ({", ".join("?" * len(JOB_FIELDS))})',
+                     [job[field] for field in JOB_FIELDS])
+        # 只保留最近的工作紀錄
+        conn.execute('DELETE FROM jobs WHERE rowid NOT IN (SELECT rowid FROM jobs ORDER BY rowid DESC LIMIT ?)',
+                     (JOB_HISTORY,))
+    finally:
+        conn.close()
+    return job
+
+def in_background_job():
+    return has_app_context() and g.get('job_id') is not None
+
+# 回報目前背景工作的進度（0~1），由 hub 上的 publish_job_progress 送出；不在背景工作中時不做任何事
+def report_progress(progress, message=None):
+    if in_background_job():
+        job = update_job(g.job_id, progress=round(progress, 3), message=message)
+        job_progress_updates[g.job_id].append(job)
+
+# 長時間的同步處理讓出給同一個 hub 上的其他請求；背景工作在原生執行緒中，不需要讓出
+def yield_to_requests():
+    if not in_background_job():
+        socketio.sleep(0)
+
+# 保存請求內容（上傳檔案先寫入暫存檔），讓背景工作在請求結束後重建相同的請求
+def snapshot_request():
+    data = request.form.to_dict(flat=False)
+    for field, file in request.files.items(multi=True):
+        spool = tempfile.TemporaryFile()
+        shutil.copyfileobj(file.stream, spool)
+        spool.seek(0)
+        data.setdefault(field, []).append((spool, file.filename, file.mimetype))
+    return {
+        'path': request.path,
+        'method': request.method,
+        'query_string': [(k, v) for k, v in request.args.items(multi=True) if k != 'async'],
+        'data': data,
+        'json': request.get_json(silent=True) if request.is_json else None
+    }
+
+# 在原生執行緒中執行，不可呼叫 socketio 的 emit / sleep / start_background_task
+def execute_job(job_id, f, args, kwargs, snapshot):
+    try:
+        with app.test_request_context(snapshot['path'], method=snapshot['method'],
+                                      query_string=snapshot['query_string'],
+                                      data=None if snapshot['json'] is not None else snapshot['data'],
+                                      json=snapshot['json']):
+            g.job_id = job_id
+            response = app.make_response(f(*args, **kwargs))
+            return response.get_json(), 'completed' if response.status_code < 400 else 'failed'
+    except Exception as e:
+        return {'error': str(e)}, 'failed'
+    finally:
+        for values in snapshot['data'].values():
+            for value in values:
+                if isinstance(value, tuple):
+                    value[0].close()
+
+def run_in_native_thread(fn, *args):
+    if socketio.async_mode == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(fn, *args)
+    # threading 模式的背景任務本身就是原生執行緒
+    return fn(*args)
+
+def publish_job_progress(job_id, updates):
+    while updates:
+        socketio.emit('job_progress', updates.popleft(), to=job_room(job_id))
+
+# 工作執行期間在 hub 上定時送出累積的進度，以及工作中上傳的資料的通知
+def watch_job(job_id, updates, finished):
+    while not finished:
+        socketio.sleep(JOB_PROGRESS_INTERVAL_S)
+        if not finished:
+            publish_job_progress(job_id, updates)
+            schedule_upload_notifications()
+
+def run_job(job_id, f, args, kwargs, snapshot):
+    update_job(job_id, status='running')
+    updates = job_progress_updates[job_id] = deque()
+    finished = []
+    socketio.start_background_task(watch_job, job_id, updates, finished)
+    try:
+        result, status = run_in_native_thread(execute_job, job_id, f, args, kwargs, snapshot)
+    finally:
+        finished.append(True)
+        del job_progress_updates[job_id]
+    publish_job_progress(job_id, updates)
+    job = update_job(job_id, status=status, result=result, progress=1 if status == 'completed' else None,
+                     finished_at=datetime.now().isoformat())
+    socketio.emit('job_completed', job, to=job_room(job_id))
+    schedule_upload_notifications()
+
+def background_job(kind):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.args.get('async') != '1':
+                return f(*args, **kwargs)
+            job = create_job(kind)
+            socketio.start_background_task(run_job, job['id'], f, args, kwargs, snapshot_request())
+            response = jsonify(job)
+            response.status_code = 202
+            response.headers['Location'] = url_for('get_job', job_id=job['id'])
+            return response
+        return decorated_function
+    return decorator
+
+# 建立資料表之後新增的欄位：舊資料庫（含還原的備份）由 create_tables 以 ALTER TABLE 補上
+ADDED_COLUMNS = {
+    'information_table': {'content_hash': 'TEXT'}
+}
+# information_table 中只供內部使用的欄位，不出現在搜尋結果、上傳通知與資料集匯出中
+INTERNAL_INFO_COLUMNS = ('content_hash',)
+
+def public_record(row):
+    record = dict(row)
+    for column in INTERNAL_INFO_COLUMNS:
+        record.pop(column, None)
+    return record
+
+# 建立 init_db 的資料表與索引（已存在者略過）
+def create_tables(cursor):
     # information_table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS information_table (
@@ -66,25 +769,510 @@ def init_db():
         )
     ''')
 
+    # VR_CURVE_STORAGE=packed 時的曲線：每筆記錄一列，data 為欄式 float64 BLOB（見 pack_curve）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS packed_curve (
+            user_id INTEGER PRIMARY KEY,
+            point_count INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES information_table(user_ID)
+        )
+    ''')
+
+    # 應用程式內部狀態（資料版本）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('data_version', 0)")
+
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+        for column, declared_type in columns.items():
+            if column not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declared_type}')
+
+    # 每筆記錄的效率曲線摘要，於上傳、刪除、修改與還原時維護，清單與排序不需讀取完整曲線
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS curve_summary (
+            user_id INTEGER PRIMARY KEY,
+            point_count INTEGER NOT NULL,
+            peak_efficiency REAL NOT NULL,
+            peak_iout REAL NOT NULL,
+            full_load_efficiency REAL NOT NULL,
+            light_load_efficiency REAL,
+            first_vin REAL NOT NULL,
+            first_vout REAL NOT NULL,
+            vin_min REAL NOT NULL,
+            vin_max REAL NOT NULL,
+            vout_min REAL NOT NULL,
+            vout_max REAL NOT NULL,
+            iout_max REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES information_table(user_ID)
+        )
+    ''')
+
+    # 各負載點（imax 的百分比）的內插效率
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS curve_load_points (
+            user_id INTEGER NOT NULL,
+            load_percent REAL NOT NULL,
+            iout REAL NOT NULL,
+            efficiency REAL,
+            PRIMARY KEY (user_id, load_percent)
+        ) WITHOUT ROWID
+    ''')
+
     # 建立索引以提升查詢效能
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_powerstage ON information_table(powerstage_name)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_phase ON information_table(phase_count)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_id ON efficiency_table(user_id)')
+    # vin/vout 範圍搜尋的覆蓋索引
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_eff_user_vin_vout ON efficiency_table(user_id, vin, vout)')
+    # 依最高效率排序與負載點排名使用的索引
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_summary_peak ON curve_summary(peak_efficiency, user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_load_points_rank ON curve_load_points(load_percent, efficiency)')
+    # /api/search 分頁排序使用的索引
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_upload_order ON information_table(COALESCE(upload_date, ''), user_ID)")
+    # 上傳時檢查重複資料使用的索引
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_content_hash ON information_table(content_hash)')
+
+# 資料庫初始化
+def init_db():
+    conn = connect_db()
+    cursor = conn.cursor()
+
+    # WAL 模式讓讀取與寫入可以同時進行（設定會保存在資料庫檔案中）
+    cursor.execute('PRAGMA journal_mode = WAL')
+
+    create_tables(cursor)
+
+    ensure_search_index(conn)
+
+    # 補齊尚未建立摘要的記錄（舊資料庫或還原的備份）；負載點設定變更時全部重建
+    stored_percents = {row[0] for row in cursor.execute('SELECT DISTINCT load_percent FROM curve_load_points')}
+    rebuild_curve_summaries(conn, missing_only=not stored_percents or stored_percents == set(SUMMARY_LOAD_PERCENTS))
+    # 補齊舊記錄的內容雜湊
+    backfill_content_hashes(conn)
 
     conn.commit()
     conn.close()
 
 # 動態取得資料表結構
 def get_table_columns(table_name):
-    conn = sqlite3.connect('data/vr_efficiency.sqlite')
-    cursor = conn.execute(f"PRAGMA table_info({table_name})")
-    columns = [row[1] for row in cursor.fetchall()]
-    conn.close()
-    return columns
+    cursor = get_db().execute(f"PRAGMA table_info({table_name})")
+    return [row[1] for row in cursor.fetchall()]
+
+# 搜尋結果使用的效率曲線欄位
+CURVE_FIELDS = ('iout', 'efficiency', 'efficiency_remote', 'vin', 'vout')
+# /api/efficiency-data 回傳的完整量測欄位
+EFFICIENCY_DATA_FIELDS = ('istep', 'vin', 'iin', 'vout', 'remote_vout_sense', 'iout', 'efficiency', 'efficiency_remote')
+
+# 曲線回傳格式（format 參數）
+#   points: 每個量測點一個物件（預設，與舊版相容）
+#   columnar: 每個欄位一個陣列
+#   f32: 每個欄位為 little-endian float32 的 base64 字串，可直接轉成 JavaScript 的 Float32Array
+CURVE_FORMATS = ('points', 'columnar', 'f32')
+
+# /api/search 分頁的每頁筆數上限
+SEARCH_MAX_PAGE_SIZE = 200
+
+# 批次取得多筆記錄的效率曲線，回傳 {user_id: {欄位: [數值...]}}（依 iout 排序）
+# 以 json_each 傳入 user_id 清單，不論記錄數量都只執行一次查詢，避免 N+1 查詢
+def fetch_efficiency_curves(conn, user_ids, fields=CURVE_FIELDS):
+    curves = {user_id: {field: [] for field in fields} for user_id in user_ids}
+    if not curves:
+        return curves
+    ids = json.dumps(list(curves))
+    cursor = conn.execute(f'''
+        SELECT user_id, {', '.join(fields)}
+        FROM efficiency_table
+        WHERE user_id IN (SELECT value FROM json_each(?))
+        ORDER BY user_id, iout
+    ''', (ids,))
+    for user_id, rows in groupby(cursor.fetchall(), key=itemgetter(0)):
+        columns = list(zip(*rows))[1:]
+        curves[user_id] = dict(zip(fields, map(list, columns)))
+    # packed 記錄直接取 BLOB 中的欄位
+    indexes = [PACKED_CURVE_FIELDS.index(field) for field in fields]
+    for user_id, point_count, data in conn.execute(
+            'SELECT user_id, point_count, data FROM packed_curve WHERE user_id IN (SELECT value FROM json_each(?))', (ids,)):
+        columns = unpack_curve(data, point_count)
+        curves[user_id] = {field: columns[index].tolist() for field, index in zip(fields, indexes)}
+    return curves
+
+# 將曲線轉成指定的回傳格式
+def format_curve(curve, curve_format):
+    if curve_format == 'columnar':
+        return curve
+    if curve_format == 'f32':
+        encoded = {}
+        for field, values in curve.items():
+            packed = array('f', values)
+            if sys.byteorder == 'big':
+                packed.byteswap()
+            encoded[field] = base64.b64encode(packed.tobytes()).decode('ascii')
+        return encoded
+    fields = list(curve)
+    return [dict(zip(fields, values)) for values in zip(*curve.values())]
+
+# 讀取並檢查 format 參數，不支援時拋出 ValueError
+def get_curve_format(args):
+    curve_format = args.get('format') or 'points'
+    if curve_format not in CURVE_FORMATS:
+        raise ValueError(f'format 只支援: {", ".join(CURVE_FORMATS)}')
+    return curve_format
+
+# max_points 參數（降採樣後的點數）的允許範圍
+DOWNSAMPLE_MIN_POINTS = 3
+DOWNSAMPLE_MAX_POINTS = 10000
+
+# 讀取並檢查 max_points 參數，未提供時回傳 None，格式錯誤時拋出 ValueError
+def get_max_points(args):
+    max_points = args.get('max_points')
+    if not max_points:
+        return None
+    max_points = int(max_points)
+    if not DOWNSAMPLE_MIN_POINTS <= max_points <= DOWNSAMPLE_MAX_POINTS:
+        raise ValueError(f'max_points 必須介於 {DOWNSAMPLE_MIN_POINTS} 與 {DOWNSAMPLE_MAX_POINTS} 之間')
+    return max_points
+
+# Largest-Triangle-Three-Buckets：保留首尾兩點，其餘各區間選出與前一個選取點、下一區間平均點
+# 所成三角形面積最大的點，回傳選取點的索引（依 x 排序）
+def lttb_indices(x, y, threshold):
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    # 每個區間的平均點，最後一個區間改用最後一點
+    counts = np.diff(edges)
+    average_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1]) / counts, x[-1])
+    average_y = np.append(np.add.reduceat(y[:n - 1], edges[:-1]) / counts, y[-1])
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_x, next_y = average_x[bucket + 1], average_y[bucket + 1]
+        areas = np.abs((x[selected] - next_x) * (y[start:end] - y[selected])
+                       - (x[selected] - x[start:end]) * (next_y - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+    return indices
+
+# 降採樣後的曲線快取，以 (user_id, 欄位, 點數, 資料版本) 為鍵，不同查詢之間共用
+curve_cache = QueryCache(
+    max_entries=int(os.environ.get('VR_CURVE_CACHE_MAX_ENTRIES', 4096)),
+    max_bytes=int(os.environ.get('VR_CURVE_CACHE_MAX_MB', 32)) * 1024 * 1024,
+    ttl=int(os.environ.get('VR_CACHE_TTL', 600))
+)
+
+# 取得曲線並以 LTTB（依 iout / efficiency）降採樣至最多 max_points 點，max_points 為 None 時回傳完整曲線
+def fetch_curves(conn, user_ids, fields=CURVE_FIELDS, max_points=None):
+    if not max_points:
+        return fetch_efficiency_curves(conn, user_ids, fields)
+    version = get_data_version(conn)
+    curves = {}
+    for user_id in user_ids:
+        cached = curve_cache.get((user_id, fields, max_points, version))
+        if cached is not None:
+            curves[user_id] = cached
+    missing = [user_id for user_id in user_ids if user_id not in curves]
+    query_fields = tuple(fields) + tuple(f for f in ('iout', 'efficiency') if f not in fields)
+    for user_id, curve in fetch_efficiency_curves(conn, missing, query_fields).items():
+        indices = lttb_indices(np.asarray(curve['iout'], dtype=float),
+                               np.asarray(curve['efficiency'], dtype=float), max_points).tolist()
+        sampled = {field: [curve[field][i] for i in indices] for field in fields}
+        curve_cache.set((user_id, fields, max_points, version), sampled, size=len(indices) * len(fields) * 8)
+        curves[user_id] = sampled
+    return {user_id: curves[user_id] for user_id in user_ids}
+
+# 批次上傳單次允許的檔案數量
+BATCH_UPLOAD_MAX_FILES = 500
+# 批次上傳的大小上限（MB）：單一檔案與全部檔案（zip 為解壓縮後）的合計，在讀取內容之前檢查
+BATCH_UPLOAD_MAX_BYTES = int(os.environ.get('VR_BATCH_MAX_MB', 200)) * 1024 * 1024
+
+# 上傳檔案的必要欄位，依序對應 efficiency_table 的欄位
+MEASUREMENT_COLUMNS = {
+    'Istep': 'istep',
+    'Vin': 'vin',
+    'Iin': 'iin',
+    'Vout': 'vout',
+    'remote Vout sense': 'remote_vout_sense',
+    'Iout': 'iout',
+    'Efficiency': 'efficiency',
+    'Efficiency_remote': 'efficiency_remote'
+}
+
+# 以向量化方式驗證並轉換上傳的量測資料，格式錯誤時拋出 ValueError
+def prepare_measurement_frame(df):
+    import pandas as pd
+    missing_columns = [col for col in MEASUREMENT_COLUMNS if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f'缺少必要欄位: {", ".join(missing_columns)}')
+
+    frame = df[list(MEASUREMENT_COLUMNS)].apply(pd.to_numeric, errors='coerce')
+    # 略過整列空白的資料（Excel 常見的尾端空白列）
+    frame = frame.dropna(how='all')
+    invalid = frame.isna().any(axis=1).to_numpy()
+    if invalid.any():
+        # 第 1 列為標題列，資料從第 2 列開始
+        rows = [str(position + 2) for position in df.index.get_indexer(frame.index[invalid])[:10]]
+        raise ValueError(f'第 {", ".join(rows)} 列含有空白或非數值資料')
+    if frame.empty:
+        raise ValueError('檔案中沒有量測資料')
+    return frame.astype('float64')
+
+# 在同一個交易中寫入量測資料（保存方式見 CURVE_STORAGE），回傳第一筆的 series_number
+def insert_measurements(cursor, user_id, frame):
+    if CURVE_STORAGE == 'packed':
+        return insert_packed_curve(cursor, user_id, frame.to_numpy())
+    return insert_measurement_rows(cursor, user_id, iter_measurement_rows(frame.to_numpy()))
+
+# 分段轉成 Python 串列：同時存在數十萬個串列會觸發完整的 GC，期間其他執行緒（hub 上的請求）無法取得 GIL
+MEASUREMENT_ROWS_CHUNK = 8192
+
+def iter_measurement_rows(values):
+    for start in range(0, len(values), MEASUREMENT_ROWS_CHUNK):
+        yield from values[start:start + MEASUREMENT_ROWS_CHUNK].tolist()
+
+# 以 executemany 批次寫入 efficiency_table；指定 first_series_number 時依序使用該編號
+def insert_measurement_rows(cursor, user_id, rows, first_series_number=None):
+    columns = list(MEASUREMENT_COLUMNS.values()) + ['user_id']
+    if first_series_number is not None:
+        columns.insert(0, 'series_number')
+        rows = ([first_series_number + index] + row for index, row in enumerate(rows))
+    cursor.executemany(f'''
+        INSERT INTO efficiency_table ({', '.join(columns)})
+        VALUES ({', '.join('?' * len(columns))})
+    ''', (row + [user_id] for row in rows))
+    cursor.execute('SELECT MIN(series_number) FROM efficiency_table WHERE user_id = ?', (user_id,))
+    return cursor.fetchone()[0]
+
+# 曲線的保存方式（VR_CURVE_STORAGE，只影響新上傳的記錄）
+#   rows: efficiency_table 每個量測點一列（預設）
+#   packed: packed_curve 每筆記錄一列，量測資料依 PACKED_CURVE_FIELDS 順序存成 little-endian float64 的欄式 BLOB（依 iout 排序）
+# 讀取時兩種都會查詢，資料庫中可以同時存在兩種記錄；以 flask --app app migrate-curves 轉換既有記錄
+CURVE_STORAGES = ('rows', 'packed')
+CURVE_STORAGE = os.environ.get('VR_CURVE_STORAGE', 'rows')
+if CURVE_STORAGE not in CURVE_STORAGES:
+    raise ValueError(f'VR_CURVE_STORAGE 必須是 {" / ".join(CURVE_STORAGES)}')
+PACKED_CURVE_FIELDS = tuple(MEASUREMENT_COLUMNS.values())
+
+# 將 BLOB 解成 (欄位數, 點數) 的唯讀陣列，不複製資料
+def unpack_curve(data, point_count):
+    return np.frombuffer(data, dtype='<f8').reshape(len(PACKED_CURVE_FIELDS), point_count)
+
+# values 為依 PACKED_CURVE_FIELDS 排列的 (點數, 欄位數) 陣列
+def pack_curve(values):
+    values = np.asarray(values, dtype='<f8')
+    values = values[np.argsort(values[:, PACKED_CURVE_FIELDS.index('iout')], kind='stable')]
+    return np.ascontiguousarray(values.T).tobytes()
+
+# 保留 count 個 efficiency_table 的 series_number，回傳第一個
+# packed 記錄的 series_number 與逐列寫入時相同（第一個量測點的編號），轉回 rows 時沿用保留的編號
+def reserve_series_numbers(cursor, count):
+    row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'efficiency_table'").fetchone()
+    if row is None:
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('efficiency_table', ?)", (count,))
+        return 1
+    cursor.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'efficiency_table'", (row[0] + count,))
+    return row[0] + 1
+
+def insert_packed_curve(cursor, user_id, values):
+    series_number = reserve_series_numbers(cursor, len(values))
+    cursor.execute('INSERT INTO packed_curve (user_id, point_count, data) VALUES (?, ?, ?)',
+                   (user_id, len(values), pack_curve(values)))
+    return series_number
+
+# SQL 函式：packed 記錄是否有任一量測點落在 vin / vout 範圍內（範圍為 NULL 時不限）
+def packed_curve_in_range(data, point_count, vin_min, vin_max, vout_min, vout_max):
+    columns = unpack_curve(data, point_count)
+    match = np.ones(point_count, dtype=bool)
+    for field, low, high in (('vin', vin_min, vin_max), ('vout', vout_min, vout_max)):
+        if low is not None:
+            values = columns[PACKED_CURVE_FIELDS.index(field)]
+            match &= (values >= low) & (values <= high)
+    return bool(match.any())
+
+# 匯出用的量測資料列（依 iout 排序，欄位同 MEASUREMENT_COLUMNS），每批 CSV_EXPORT_BATCH_ROWS 列
+def iter_curve_rows(conn, user_id):
+    packed = conn.execute('SELECT data, point_count FROM packed_curve WHERE user_id = ?', (user_id,)).fetchone()
+    if packed:
+        rows = list(zip(*unpack_curve(*packed).tolist()))
+        return (rows[start:start + CSV_EXPORT_BATCH_ROWS] for start in range(0, len(rows), CSV_EXPORT_BATCH_ROWS))
+    cursor = conn.execute(CSV_EXPORT_QUERY, (user_id,))
+    return iter(lambda: cursor.fetchmany(CSV_EXPORT_BATCH_ROWS), [])
+
+# 在 rows 與 packed 之間轉換既有記錄，每批 SUMMARY_REBUILD_BATCH 筆各自 commit（中斷後可重新執行）
+# progress(已轉換, 總數)；回傳轉換的記錄數
+def migrate_curve_storage(conn, target, progress=None):
+    if target == 'packed':
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(efficiency_table)')}
+        extra = columns - set(PACKED_CURVE_FIELDS) - {'series_number', 'user_id'}
+        if extra:
+            raise ValueError(f'efficiency_table 有 packed 無法保存的欄位: {", ".join(sorted(extra))}')
+        user_ids = [row[0] for row in conn.execute('SELECT DISTINCT user_id FROM efficiency_table ORDER BY user_id')]
+    else:
+        user_ids = [row[0] for row in conn.execute('SELECT user_id FROM packed_curve ORDER BY user_id')]
+
+    for start in range(0, len(user_ids), SUMMARY_REBUILD_BATCH):
+        ids = json.dumps(user_ids[start:start + SUMMARY_REBUILD_BATCH])
+        if target == 'packed':
+            rows = conn.execute(f'''
+                SELECT user_id, {', '.join(PACKED_CURVE_FIELDS)} FROM efficiency_table
+                WHERE user_id IN (SELECT value FROM json_each(?))
+                ORDER BY user_id, iout, series_number
+            ''', (ids,)).fetchall()
+            packed = []
+            for user_id, points in groupby(rows, key=itemgetter(0)):
+                values = [point[1:] for point in points]
+                packed.append((user_id, len(values), pack_curve(values)))
+            conn.executemany('INSERT INTO packed_curve (user_id, point_count, data) VALUES (?, ?, ?)', packed)
+            conn.execute('DELETE FROM efficiency_table WHERE user_id IN (SELECT value FROM json_each(?))', (ids,))
+        else:
+            for user_id, series_number, point_count, data in conn.execute('''
+                SELECT p.user_id, i.series_number, p.point_count, p.data
+                FROM packed_curve p LEFT JOIN information_table i ON i.user_ID = p.user_id
+                WHERE p.user_id IN (SELECT value FROM json_each(?))
+            ''', (ids,)).fetchall():
+                rows = [list(point) for point in zip(*unpack_curve(data, point_count).tolist())]
+                taken = series_number is None or conn.execute(
+                    'SELECT 1 FROM efficiency_table WHERE series_number BETWEEN ? AND ?',
+                    (series_number, series_number + point_count - 1)).fetchone()
+                if taken:
+                    # 保留的編號已被使用時改由 AUTOINCREMENT 重新編號
+                    series_number = insert_measurement_rows(conn.cursor(), user_id, rows)
+                    conn.execute('UPDATE information_table SET series_number = ? WHERE user_ID = ?', (series_number, user_id))
+                else:
+                    insert_measurement_rows(conn.cursor(), user_id, rows, series_number)
+            conn.execute('DELETE FROM packed_curve WHERE user_id IN (SELECT value FROM json_each(?))', (ids,))
+        conn.commit()
+        if progress:
+            progress(min(start + SUMMARY_REBUILD_BATCH, len(user_ids)), len(user_ids))
+    return len(user_ids)
+
+# 量測資料的內容雜湊：各列依欄位值排序後，以 little-endian float64 計算 SHA-256
+# 同一份資料不論 CSV / Excel、數值寫法（1 與 1.0）或列的順序都得到相同的雜湊
+def measurement_hash(values):
+    values = np.asarray(values, dtype='<f8').reshape(-1, len(MEASUREMENT_COLUMNS)) + 0.0  # -0.0 視為 0.0
+    values = values[np.lexsort(values.T[::-1])]
+    return hashlib.sha256(np.ascontiguousarray(values).tobytes()).hexdigest()
+
+# 上傳的資料與既有記錄相同時的處理方式（on_duplicate 欄位）；兩者都不寫入新的記錄，上傳的記錄資訊不會保存
+#   reject: 回傳 409 與既有記錄（預設）
+#   return_existing: 回傳 200 與既有記錄的 user_id / series_number
+DUPLICATE_POLICIES = ('reject', 'return_existing')
+
+def get_duplicate_policy(fields):
+    policy = fields.get('on_duplicate') or 'reject'
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(f'on_duplicate 必須是 {" / ".join(DUPLICATE_POLICIES)}')
+    return policy
+
+# 回傳內容雜湊相同的最早一筆記錄（沒有時回傳 None）
+# 需在 BEGIN IMMEDIATE 的交易中與寫入一起執行，其他 worker 無法在檢查與寫入之間寫入相同的資料
+def find_duplicate(conn, digest):
+    row = conn.execute('''
+        SELECT user_ID, series_number FROM information_table
+        WHERE content_hash = ? ORDER BY user_ID LIMIT 1
+    ''', (digest,)).fetchone()
+    return {'user_id': row[0], 'series_number': row[1]} if row else None
+
+def duplicate_error(duplicate):
+    return {'error': f'相同的量測資料已上傳過（series_number {duplicate["series_number"]}）', 'duplicate_of': duplicate}
+
+# 計算尚未有內容雜湊的記錄（舊資料庫或還原的備份）；沒有量測點的記錄略過
+def backfill_content_hashes(conn):
+    user_ids = [row[0] for row in conn.execute('SELECT user_ID FROM information_table WHERE content_hash IS NULL')]
+    fields = tuple(MEASUREMENT_COLUMNS.values())
+    for start in range(0, len(user_ids), SUMMARY_REBUILD_BATCH):
+        curves = fetch_efficiency_curves(conn, user_ids[start:start + SUMMARY_REBUILD_BATCH], fields)
+        conn.executemany('UPDATE information_table SET content_hash = ? WHERE user_ID = ?', [
+            (measurement_hash(np.column_stack([curve[field] for field in fields])), user_id)
+            for user_id, curve in curves.items() if curve['iout']
+        ])
+
+# 曲線摘要的負載點（imax 的百分比），可由環境變數 VR_SUMMARY_LOAD_POINTS 設定，例如 "10,50,100"
+SUMMARY_LOAD_PERCENTS = tuple(float(p) for p in os.environ.get('VR_SUMMARY_LOAD_POINTS', '10,50,100').split(','))
+# 輕載效率：iout 不超過 imax 此百分比的量測點之平均效率
+LIGHT_LOAD_PERCENT = float(os.environ.get('VR_SUMMARY_LIGHT_LOAD_PERCENT', 20))
+# 計算摘要所需的曲線欄位
+SUMMARY_FIELDS = ('iout', 'efficiency', 'vin', 'vout')
+# 重建摘要時每批處理的記錄數
+SUMMARY_REBUILD_BATCH = 1000
+
+# 在依 iout 排序的曲線上線性內插 target 的效率，超出量測範圍時回傳 None
+def interpolate_efficiency(iouts, efficiencies, target):
+    if not iouts or target < iouts[0]:
+        return None
+    if target > iouts[-1]:
+        # 滿載量測點常略低於 imax，容許 2% 的誤差
+        return efficiencies[-1] if target <= iouts[-1] * 1.02 else None
+    index = bisect_left(iouts, target)
+    if iouts[index] == target:
+        return efficiencies[index]
+    x0, x1 = iouts[index - 1], iouts[index]
+    y0, y1 = efficiencies[index - 1], efficiencies[index]
+    return y0 + (y1 - y0) * (target - x0) / (x1 - x0)
+
+# 由一條曲線計算摘要列與負載點列，沒有量測點時回傳 (None, [])
+def compute_curve_summary(user_id, curve, imax):
+    iouts, efficiencies = curve['iout'], curve['efficiency']
+    if not iouts:
+        return None, []
+    try:
+        imax = float(imax)
+    except (TypeError, ValueError):
+        imax = 0
+    peak_index = max(range(len(efficiencies)), key=efficiencies.__getitem__)
+    light_load = [e for i, e in zip(iouts, efficiencies) if imax > 0 and i <= imax * LIGHT_LOAD_PERCENT / 100]
+    summary_row = (
+        user_id, len(iouts), efficiencies[peak_index], iouts[peak_index], efficiencies[-1],
+        sum(light_load) / len(light_load) if light_load else None,
+        curve['vin'][0], curve['vout'][0], min(curve['vin']), max(curve['vin']),
+        min(curve['vout']), max(curve['vout']), iouts[-1]
+    )
+    load_rows = []
+    if imax > 0:
+        for percent in SUMMARY_LOAD_PERCENTS:
+            target = imax * percent / 100
+            load_rows.append((user_id, percent, target, interpolate_efficiency(iouts, efficiencies, target)))
+    return summary_row, load_rows
+
+# 重新計算指定記錄的曲線摘要（在呼叫端的交易中執行）
+def refresh_curve_summaries(conn, user_ids):
+    ids = json.dumps(list(user_ids))
+    conn.execute('DELETE FROM curve_summary WHERE user_id IN (SELECT value FROM json_each(?))', (ids,))
+    conn.execute('DELETE FROM curve_load_points WHERE user_id IN (SELECT value FROM json_each(?))', (ids,))
+    imax_by_id = dict(conn.execute(
+        'SELECT user_ID, imax FROM information_table WHERE user_ID IN (SELECT value FROM json_each(?))', (ids,)))
+    curves = fetch_efficiency_curves(conn, list(imax_by_id), SUMMARY_FIELDS)
+    summary_rows, load_rows = [], []
+    for user_id, curve in curves.items():
+        summary_row, rows = compute_curve_summary(user_id, curve, imax_by_id[user_id])
+        if summary_row:
+            summary_rows.append(summary_row)
+            load_rows.extend(rows)
+    conn.executemany(f'''
+        INSERT INTO curve_summary VALUES ({', '.join('?' * 13)})
+    ''', summary_rows)
+    conn.executemany('INSERT INTO curve_load_points VALUES (?, ?, ?, ?)', load_rows)
+
+# 批次重建曲線摘要；missing_only 時只處理尚未建立摘要的記錄
+def rebuild_curve_summaries(conn, missing_only=False):
+    query = 'SELECT user_ID FROM information_table'
+    if missing_only:
+        query += ' WHERE user_ID NOT IN (SELECT user_id FROM curve_summary)'
+    user_ids = [row[0] for row in conn.execute(query)]
+    for start in range(0, len(user_ids), SUMMARY_REBUILD_BATCH):
+        refresh_curve_summaries(conn, user_ids[start:start + SUMMARY_REBUILD_BATCH])
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', socket_transports=socketio_options.get('transports', ['polling', 'websocket']))
 
 @app.route('/admin/login', methods=['POST'])
 def admin_login():
@@ -100,7 +1288,114 @@ def admin_logout():
     session.pop('is_admin', None)
     return jsonify({'success': True})
 
+# 讀取上傳的 CSV / Excel 量測檔，格式不支援時拋出 ValueError
+# pandas 只在解析上傳檔案時才載入，各 worker 啟動時不需付出匯入的時間與記憶體
+def read_measurement_file(filename, stream):
+    import pandas as pd
+    if filename.endswith('.csv'):
+        file_content = stream.read().decode('utf-8')
+        return pd.read_csv(io.StringIO(file_content))
+    elif filename.endswith(('.xlsx', '.xls')):
+        return pd.read_excel(stream)
+    raise ValueError('不支援的檔案格式，請上傳 CSV 或 Excel 檔案')
+
+# 由表單或 manifest 欄位組出 information_table 資料，缺少或格式錯誤時拋出 ValueError
+def parse_info_fields(fields):
+    info_data = {
+        'user_name': fields.get('user_name'),
+        'pcb_name': fields.get('pcb_name'),
+        'powerstage_name': fields.get('powerstage_name'),
+        'tlvr': fields.get('tlvr'),
+        'upload_date': datetime.now().isoformat(),
+        'notice': fields.get('notice', '')
+    }
+    for key in ('phase_count', 'frequency', 'inductor_value', 'imax'):
+        try:
+            info_data[key] = int(fields.get(key))
+        except (TypeError, ValueError):
+            raise ValueError(f'欄位 {key} 必須是整數')
+    missing = [key for key in ('user_name', 'pcb_name', 'powerstage_name') if not info_data[key]]
+    if missing:
+        raise ValueError(f'缺少必要欄位: {", ".join(missing)}')
+    return info_data
+
+# 寫入一筆測試記錄（information_table + efficiency_table），回傳 (user_id, series_number)
+def insert_record(cursor, info_data, measurements):
+    # 插入 information_table
+    cursor.execute('''
+        INSERT INTO information_table 
+        (user_name, pcb_name, powerstage_name, phase_count, frequency, 
+         inductor_value, tlvr, imax, upload_date, notice, content_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (info_data['user_name'], info_data['pcb_name'], info_data['powerstage_name'],
+          info_data['phase_count'], info_data['frequency'], info_data['inductor_value'],
+          info_data['tlvr'], info_data['imax'], info_data['upload_date'], info_data['notice'],
+          info_data['content_hash']))
+
+    user_id = cursor.lastrowid
+
+    # 插入 efficiency_table 並獲取 series_number
+    series_number = insert_measurements(cursor, user_id, measurements)
+
+    # 更新 information_table 的 series_number
+    cursor.execute('''
+        UPDATE information_table
+        SET series_number = ?
+        WHERE user_ID = ?
+    ''', (series_number, user_id))
+
+    refresh_curve_summaries(cursor.connection, [user_id])
+    return user_id, series_number
+
+# 上傳通知：合併 UPLOAD_NOTIFY_WINDOW_MS 內的上傳（同一筆只通知一次），只發送給加入 UPLOAD_NOTIFY_ROOM 的客戶端
+UPLOAD_NOTIFY_ROOM = 'uploads'
+UPLOAD_NOTIFY_WINDOW_MS = int(os.environ.get('VR_UPLOAD_NOTIFY_WINDOW_MS', 500))
+pending_upload_ids = []
+pending_uploads_lock = native_lock()
+upload_flush_scheduled = False
+
+def notify_uploads(user_ids):
+    with pending_uploads_lock:
+        pending_upload_ids.extend(user_ids)
+    # 背景工作的執行緒不能啟動 socketio 背景任務，由 hub 上的 run_job / watch_job 排程
+    if not in_background_job():
+        schedule_upload_notifications()
+
+def schedule_upload_notifications():
+    global upload_flush_scheduled
+    with pending_uploads_lock:
+        if upload_flush_scheduled or not pending_upload_ids:
+            return
+        upload_flush_scheduled = True
+    socketio.start_background_task(flush_upload_notifications)
+
+# 通知內容與 /api/search?fields=meta 的記錄相同，客戶端可直接加入清單，不需重新查詢
+def flush_upload_notifications():
+    global upload_flush_scheduled
+    socketio.sleep(UPLOAD_NOTIFY_WINDOW_MS / 1000)
+    with pending_uploads_lock:
+        user_ids = list(dict.fromkeys(pending_upload_ids))
+        pending_upload_ids.clear()
+        upload_flush_scheduled = False
+    with app.app_context():
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        # 通知送出前已被刪除的記錄不會出現
+        records = [public_record(row) for row in cursor.execute('''
+            SELECT * FROM information_table
+            WHERE user_ID IN (SELECT value FROM json_each(?))
+            ORDER BY COALESCE(upload_date, '') DESC, user_ID DESC
+        ''', (json.dumps(user_ids),))]
+        summaries = fetch_curve_summaries(conn, [record['user_ID'] for record in records])
+    for record in records:
+        record['summary'] = summaries[record['user_ID']]
+    if records:
+        socketio.emit('new_data_uploaded', {**records[0], 'count': len(records), 'records': records},
+                      to=UPLOAD_NOTIFY_ROOM)
+
 @app.route('/upload', methods=['POST'])
+@background_job('upload')
 def upload_file():
     if 'file' not in request.files:
         return jsonify({'error': '沒有檔案'}), 400
@@ -109,320 +1404,997 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': '請選擇檔案'}), 400
 
-    # 檢查檔案類型
-    if file.filename.endswith('.csv'):
-        file_content = file.read().decode('utf-8')
-        df = pd.read_csv(io.StringIO(file_content))
-    elif file.filename.endswith(('.xlsx', '.xls')):
-        df = pd.read_excel(file)
-    else:
-        return jsonify({'error': '不支援的檔案格式，請上傳 CSV 或 Excel 檔案'}), 400
-
-    # 獲取 information_table 資料
-    info_data = {
-        'user_name': request.form.get('user_name'),
-        'pcb_name': request.form.get('pcb_name'),
-        'powerstage_name': request.form.get('powerstage_name'),
-        'phase_count': int(request.form.get('phase_count')),
-        'frequency': int(request.form.get('frequency')),
-        'inductor_value': int(request.form.get('inductor_value')),
-        'tlvr': request.form.get('tlvr'),
-        'imax': int(request.form.get('imax')),
-        'upload_date': datetime.now().isoformat(),
-        'notice': request.form.get('notice', '')
-    }
-
     try:
-        # 驗證必要欄位
-        required_columns = ['Istep', 'Vin', 'Iin', 'Vout', 'remote Vout sense', 'Iout', 'Efficiency', 'Efficiency_remote']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        # 檢查檔案類型並取得 information_table 資料
+        df = read_measurement_file(file.filename, file)
+        info_data = parse_info_fields(request.form)
+        # 驗證必要欄位並轉換為數值（在開啟資料庫連線之前完成，避免長時間持有寫入鎖）
+        measurements = prepare_measurement_frame(df)
+        info_data['content_hash'] = measurement_hash(measurements)
+        on_duplicate = get_duplicate_policy(request.form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-        if missing_columns:
-            return jsonify({'error': f'缺少必要欄位: {", ".join(missing_columns)}'}), 400
-
-        conn = sqlite3.connect('data/vr_efficiency.sqlite')
+    try:
+        conn = get_db()
         cursor = conn.cursor()
+        # 先取得寫入鎖再檢查，相同資料已存在時不寫入
+        cursor.execute('BEGIN IMMEDIATE')
+        duplicate = find_duplicate(conn, info_data['content_hash'])
+        if duplicate:
+            conn.rollback()
+            if on_duplicate == 'return_existing':
+                return jsonify({'success': True, 'duplicate': True, **duplicate})
+            return jsonify(duplicate_error(duplicate)), 409
 
-        # 插入 information_table
-        cursor.execute('''
-            INSERT INTO information_table 
-            (user_name, pcb_name, powerstage_name, phase_count, frequency, 
-             inductor_value, tlvr, imax, upload_date, notice)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (info_data['user_name'], info_data['pcb_name'], info_data['powerstage_name'],
-              info_data['phase_count'], info_data['frequency'], info_data['inductor_value'],
-              info_data['tlvr'], info_data['imax'], info_data['upload_date'], info_data['notice']))
-
-        user_id = cursor.lastrowid
-
-        # 插入 efficiency_table 並獲取 series_number
-        series_number = None
-        for _, row in df.iterrows():
-            cursor.execute('''
-                INSERT INTO efficiency_table 
-                (istep, vin, iin, vout, remote_vout_sense, iout, efficiency, efficiency_remote, user_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (row['Istep'], row['Vin'], row['Iin'], row['Vout'],
-                  row['remote Vout sense'], row['Iout'], row['Efficiency'], 
-                  row['Efficiency_remote'], user_id))
-
-            if series_number is None:
-                series_number = cursor.lastrowid
-
-        # 更新 information_table 的 series_number
-        cursor.execute('''
-            UPDATE information_table
-            SET series_number = ?
-            WHERE user_ID = ?
-        ''', (series_number, user_id))
-
+        user_id, series_number = insert_record(cursor, info_data, measurements)
+        bump_data_version(conn)
         conn.commit()
-        conn.close()
 
-        # 即時通知所有客戶端
-        socketio.emit('new_data_uploaded', {
-            'user_id': user_id,
-            'pcb_name': info_data['pcb_name'],
-            'user_name': info_data['user_name'],
-            'powerstage_name': info_data['powerstage_name']
-        })
+        notify_uploads([user_id])
 
         return jsonify({'success': True, 'user_id': user_id, 'series_number': series_number})
 
     except Exception as e:
+        get_db().rollback()
         return jsonify({'error': f'處理檔案時發生錯誤: {str(e)}'}), 500
 
-@app.route('/api/search')
-def search_records():
-    # 多條件搜尋
-    powerstage_name = request.args.get('powerstage_name')
-    phase_count = request.args.get('phase_count')
-    frequency = request.args.get('frequency')
-    inductor_value = request.args.get('inductor_value')
-    pcb_name = request.args.get('pcb_name')
-    vin_min = request.args.get('vin_min')
-    vin_max = request.args.get('vin_max')
-    vout_min = request.args.get('vout_min')
-    vout_max = request.args.get('vout_max')
-    tlvr = request.args.get('tlvr')
-    imax_min = request.args.get('imax_min')
-    imax_max = request.args.get('imax_max')
-    
-    conn = sqlite3.connect('data/vr_efficiency.sqlite')
-    conn.row_factory = sqlite3.Row
-    
-    # 如果有 vin/vout 範圍條件，需要 JOIN efficiency_table
-    if vin_min or vin_max or vout_min or vout_max:
-        query = """
-            SELECT DISTINCT i.* FROM information_table i
-            JOIN efficiency_table e ON i.user_ID = e.user_id
-            WHERE 1=1
-        """
-    else:
-        query = "SELECT * FROM information_table WHERE 1=1"
-    
+# 檢查批次上傳的檔案數量與大小（sizes 為各檔案未壓縮的位元組數），超過上限時拋出 ValueError
+def check_batch_limits(sizes):
+    if len(sizes) > BATCH_UPLOAD_MAX_FILES:
+        raise ValueError(f'單次最多上傳 {BATCH_UPLOAD_MAX_FILES} 個檔案')
+    if any(size > BATCH_UPLOAD_MAX_BYTES for size in sizes) or sum(sizes) > BATCH_UPLOAD_MAX_BYTES:
+        raise ValueError(f'批次上傳的檔案合計不可超過 {BATCH_UPLOAD_MAX_BYTES // (1024 * 1024)} MB')
+
+# 取出批次上傳的檔案：multipart 的 files 欄位，或 archive 欄位的 zip 壓縮檔
+# 回傳 [(檔名, 檔案內容)] 與 zip 內附的 manifest.json（若有）；數量與大小在讀取內容之前檢查
+def collect_batch_files():
+    uploads = [file for file in request.files.getlist('files') if file.filename]
+    archive = request.files.get('archive')
+    entries = []
+    zf = None
+    try:
+        if archive and archive.filename:
+            zf = zipfile.ZipFile(archive.stream)
+            # 略過資料夾與 macOS 產生的隱藏檔
+            entries = [entry for entry in zf.infolist()
+                       if not entry.is_dir() and os.path.basename(entry.filename)
+                       and not os.path.basename(entry.filename).startswith('.')
+                       and not entry.filename.startswith('__MACOSX/')]
+        # multipart 的檔案已由 werkzeug 存入暫存檔，以檔案長度判斷大小；zip 以目錄中記錄的解壓縮後大小判斷
+        sizes = []
+        for file in uploads:
+            file.stream.seek(0, os.SEEK_END)
+            sizes.append(file.stream.tell())
+        check_batch_limits(sizes + [entry.file_size for entry in entries])
+
+        files = []
+        manifest = None
+        for file in uploads:
+            file.stream.seek(0)
+            files.append((os.path.basename(file.filename), io.BytesIO(file.read())))
+        for entry in entries:
+            name = os.path.basename(entry.filename)
+            if name == 'manifest.json':
+                manifest = json.loads(zf.read(entry).decode('utf-8'))
+            else:
+                files.append((name, io.BytesIO(zf.read(entry))))
+        return files, manifest
+    except zipfile.BadZipFile:
+        raise ValueError('無效的 zip 壓縮檔')
+    finally:
+        if zf is not None:
+            zf.close()
+
+@app.route('/upload/batch', methods=['POST'])
+@background_job('upload_batch')
+def upload_batch():
+    # manifest 格式: {"defaults": {共用欄位}, "files": {"檔名": {個別欄位}}}
+    # 欄位優先順序：個別檔案 > manifest defaults > 表單欄位
+    try:
+        files, manifest = collect_batch_files()
+        if request.form.get('manifest'):
+            manifest = json.loads(request.form['manifest'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not files:
+        return jsonify({'error': '沒有檔案'}), 400
+    manifest = manifest or {}
+    if not isinstance(manifest, dict):
+        return jsonify({'error': 'manifest 格式錯誤'}), 400
+
+    defaults = {**request.form.to_dict(), **manifest.get('defaults', {})}
+    per_file = manifest.get('files', {})
+
+    # 先解析並驗證全部檔案，寫入時才開啟交易
+    results = []
+    pending = []
+    for filename, stream in files:
+        report_progress(len(results) / len(files) / 2, f'解析 {filename}')
+        try:
+            fields = {**defaults, **per_file.get(filename, {})}
+            info_data = parse_info_fields(fields)
+            on_duplicate = get_duplicate_policy(fields)
+            measurements = prepare_measurement_frame(read_measurement_file(filename, stream))
+            info_data['content_hash'] = measurement_hash(measurements)
+            pending.append((len(results), info_data, measurements, on_duplicate))
+            results.append({'filename': filename, 'success': False})
+        except Exception as e:
+            results.append({'filename': filename, 'success': False, 'error': str(e)})
+
+    uploaded = []
+    if pending:
+        try:
+            conn = get_db()
+            cursor = conn.cursor()
+            # 重複檢查與寫入在同一個持有寫入鎖的交易中
+            cursor.execute('BEGIN IMMEDIATE')
+            for written, (index, info_data, measurements, on_duplicate) in enumerate(pending):
+                report_progress(0.5 + written / len(pending) / 2, f'寫入 {results[index]["filename"]}')
+                # 同一批次中較早寫入的檔案也會被找到
+                duplicate = find_duplicate(conn, info_data['content_hash'])
+                if duplicate:
+                    if on_duplicate == 'return_existing':
+                        results[index].update({'success': True, 'duplicate': True, **duplicate})
+                    else:
+                        results[index].update(duplicate_error(duplicate))
+                    continue
+                # 每個檔案使用獨立的 SAVEPOINT，單一檔案失敗不影響其他檔案
+                cursor.execute('SAVEPOINT batch_file')
+                try:
+                    user_id, series_number = insert_record(cursor, info_data, measurements)
+                    cursor.execute('RELEASE batch_file')
+                except sqlite3.Error as e:
+                    cursor.execute('ROLLBACK TO batch_file')
+                    cursor.execute('RELEASE batch_file')
+                    results[index]['error'] = f'寫入資料庫失敗: {str(e)}'
+                    continue
+                results[index].update({'success': True, 'user_id': user_id, 'series_number': series_number})
+                uploaded.append(user_id)
+            if uploaded:
+                bump_data_version(conn)
+            conn.commit()
+        except Exception as e:
+            get_db().rollback()
+            return jsonify({'error': f'處理檔案時發生錯誤: {str(e)}'}), 500
+
+    if uploaded:
+        notify_uploads(uploaded)
+
+    succeeded = sum(result['success'] for result in results)
+    return jsonify({
+        'success': succeeded == len(results),
+        'uploaded': len(uploaded),
+        'duplicates': sum(bool(result.get('duplicate') or result.get('duplicate_of')) for result in results),
+        'failed': len(results) - succeeded,
+        'results': results
+    })
+
+# 文字欄位的部分比對：關鍵字夠長時經由 trigram 索引，否則掃描 information_table
+def text_match_filter(column, value, use_index):
+    if use_index and len(value) >= SEARCH_INDEX_MIN_CHARS:
+        return f" AND i.user_ID IN (SELECT rowid FROM information_fts WHERE {column} LIKE ?)"
+    return f" AND i.{column} LIKE ?"
+
+# 依搜尋參數組出 information_table（別名 i）的 WHERE 子句與參數
+# use_index: 是否可使用 information_fts（見 has_search_index）
+def build_search_filters(args, use_index=False):
+    powerstage_name = args.get('powerstage_name')
+    phase_count = args.get('phase_count')
+    frequency = args.get('frequency')
+    inductor_value = args.get('inductor_value')
+    pcb_name = args.get('pcb_name')
+    vin_min = args.get('vin_min')
+    vin_max = args.get('vin_max')
+    vout_min = args.get('vout_min')
+    vout_max = args.get('vout_max')
+    tlvr = args.get('tlvr')
+    imax_min = args.get('imax_min')
+    imax_max = args.get('imax_max')
+
+    where = "WHERE 1=1"
     params = []
-    
+
     if powerstage_name:
-        query += " AND i.powerstage_name LIKE ?" if (vin_min or vin_max or vout_min or vout_max) else " AND powerstage_name LIKE ?"
+        where += text_match_filter('powerstage_name', powerstage_name, use_index)
         params.append(f"%{powerstage_name}%")
     if phase_count:
-        query += " AND i.phase_count = ?" if (vin_min or vin_max or vout_min or vout_max) else " AND phase_count = ?"
+        where += " AND i.phase_count = ?"
         params.append(int(phase_count))
     if frequency:
-        query += " AND i.frequency = ?" if (vin_min or vin_max or vout_min or vout_max) else " AND frequency = ?"
+        where += " AND i.frequency = ?"
         params.append(int(frequency))
     if inductor_value:
-        query += " AND i.inductor_value = ?" if (vin_min or vin_max or vout_min or vout_max) else " AND inductor_value = ?"
+        where += " AND i.inductor_value = ?"
         params.append(int(inductor_value))
     if pcb_name:
-        query += " AND i.pcb_name LIKE ?" if (vin_min or vin_max or vout_min or vout_max) else " AND pcb_name LIKE ?"
+        where += text_match_filter('pcb_name', pcb_name, use_index)
         params.append(f"%{pcb_name}%")
-    
-    # 新增 vin/vout 範圍條件
-    if vin_min and vin_max:
-        query += " AND e.vin BETWEEN ? AND ?"
-        params.extend([float(vin_min), float(vin_max)])
-    if vout_min and vout_max:
-        query += " AND e.vout BETWEEN ? AND ?"
-        params.extend([float(vout_min), float(vout_max)])
-    
+
+    # 新增 vin/vout 範圍條件：以 EXISTS 半連接判斷是否有任一量測點落在範圍內
+    # 由 idx_eff_user_vin_vout 覆蓋索引直接回答，不需讀取量測資料列，也不需 DISTINCT 去除重複
+    # packed 記錄先以曲線摘要的範圍排除，再由 packed_curve_in_range 檢查各量測點
+    if vin_min or vin_max or vout_min or vout_max:
+        point_conditions = ""
+        summary_conditions = ""
+        ranges = [None] * 4
+        if vin_min and vin_max:
+            point_conditions += " AND e.vin BETWEEN ? AND ?"
+            summary_conditions += " AND s.vin_max >= ? AND s.vin_min <= ?"
+            ranges[0:2] = [float(vin_min), float(vin_max)]
+        if vout_min and vout_max:
+            point_conditions += " AND e.vout BETWEEN ? AND ?"
+            summary_conditions += " AND s.vout_max >= ? AND s.vout_min <= ?"
+            ranges[2:4] = [float(vout_min), float(vout_max)]
+        bounds = [value for value in ranges if value is not None]
+        where += (f" AND (EXISTS (SELECT 1 FROM efficiency_table e WHERE e.user_id = i.user_ID{point_conditions})"
+                  f" OR EXISTS (SELECT 1 FROM packed_curve p JOIN curve_summary s ON s.user_id = p.user_id"
+                  f" WHERE p.user_id = i.user_ID{summary_conditions}"
+                  f" AND packed_curve_in_range(p.data, p.point_count, ?, ?, ?, ?)))")
+        params.extend(bounds + bounds + ranges)
+
     # 新增 TLVR 條件
     if tlvr:
-        table_prefix = "i." if (vin_min or vin_max or vout_min or vout_max) else ""
-        query += f" AND {table_prefix}tlvr = ?"
+        where += " AND i.tlvr = ?"
         params.append(tlvr)
-    
+
     # 新增 Max Current 範圍條件
     if imax_min and imax_max:
-        table_prefix = "i." if (vin_min or vin_max or vout_min or vout_max) else ""
-        query += f" AND {table_prefix}imax BETWEEN ? AND ?"
+        where += " AND i.imax BETWEEN ? AND ?"
         params.extend([float(imax_min), float(imax_max)])
-    
-    query += " ORDER BY i.upload_date DESC" if (vin_min or vin_max or vout_min or vout_max) else " ORDER BY upload_date DESC"
-    
-    cursor = conn.execute(query, params)
-    records = []
-    for row in cursor.fetchall():
+
+    return where, params
+
+# 搜尋結果排序方式：FROM 子句、排序鍵與同值時的排序鍵（皆為遞減）
+SEARCH_SORTS = {
+    'upload_date': ("information_table i", "COALESCE(i.upload_date, '')", "i.user_ID"),
+    'peak_efficiency': ("curve_summary s JOIN information_table i ON i.user_ID = s.user_id",
+                        "s.peak_efficiency", "s.user_id"),
+}
+
+# 分頁游標：最後一筆的 (排序鍵, user_ID)，以 base64 編碼
+def encode_search_cursor(sort_value, user_id):
+    key = [sort_value, user_id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+def decode_search_cursor(token):
+    sort_value, user_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    if not isinstance(sort_value, (str, int, float)):
+        raise ValueError('無效的游標')
+    return sort_value, int(user_id)
+
+# 讀取清單顯示用的曲線摘要（預先計算於 curve_summary / curve_load_points）
+def fetch_curve_summaries(conn, user_ids):
+    summaries = {user_id: None for user_id in user_ids}
+    if not summaries:
+        return summaries
+    ids = json.dumps(list(summaries))
+    cursor = conn.execute('''
+        SELECT user_id, point_count, peak_efficiency, peak_iout, full_load_efficiency, light_load_efficiency,
+               first_vin, first_vout, vin_min, vin_max, vout_min, vout_max, iout_max
+        FROM curve_summary
+        WHERE user_id IN (SELECT value FROM json_each(?))
+    ''', (ids,))
+    for row in cursor:
+        summaries[row[0]] = {
+            'point_count': row[1],
+            'peak_efficiency': row[2],
+            'peak_iout': row[3],
+            'full_load_efficiency': row[4],
+            'light_load_efficiency': row[5],
+            'vin': row[6],
+            'vout': row[7],
+            'vin_range': [row[8], row[9]],
+            'vout_range': [row[10], row[11]],
+            'iout_max': row[12],
+            'load_points': []
+        }
+    cursor = conn.execute('''
+        SELECT user_id, load_percent, iout, efficiency
+        FROM curve_load_points
+        WHERE user_id IN (SELECT value FROM json_each(?))
+        ORDER BY user_id, load_percent
+    ''', (ids,))
+    for user_id, load_percent, iout, efficiency in cursor:
+        if summaries[user_id]:
+            summaries[user_id]['load_points'].append({'load_percent': load_percent, 'iout': iout, 'efficiency': efficiency})
+    return summaries
+
+@app.route('/api/search')
+@cached_response
+def search_records():
+    # 多條件搜尋
+    # limit: 每頁筆數，提供時改以 {records, next_cursor, total} 分頁回傳
+    # cursor: 上一頁回傳的 next_cursor
+    # fields=meta: 不回傳 efficiency_data，只附上曲線摘要
+    # max_points: efficiency_data 以 LTTB 降採樣的最大點數
+    # sort: upload_date（預設，新到舊）或 peak_efficiency（高到低，僅含有曲線的記錄）
+    limit = request.args.get('limit')
+    cursor_token = request.args.get('cursor')
+    meta_only = request.args.get('fields') == 'meta'
+
+    try:
+        curve_format = get_curve_format(request.args)
+        max_points = get_max_points(request.args)
+        where, params = build_search_filters(request.args, has_search_index(get_db()))
+        page_size = min(max(int(limit), 1), SEARCH_MAX_PAGE_SIZE) if limit else None
+        after = decode_search_cursor(cursor_token) if cursor_token else None
+        from_clause, sort_key, tiebreak = SEARCH_SORTS[request.args.get('sort', 'upload_date')]
+    except (ValueError, TypeError, KeyError):
+        return jsonify({'error': '無效的搜尋參數'}), 400
+
+    conn = get_db()
+
+    query = f"SELECT i.*, {sort_key} AS _sort_key FROM {from_clause} {where}"
+    query_params = list(params)
+    if after:
+        query += f" AND ({sort_key}, {tiebreak}) < (?, ?)"
+        query_params.extend(after)
+    query += f" ORDER BY {sort_key} DESC, {tiebreak} DESC"
+    if page_size:
+        # 多取一筆用來判斷是否還有下一頁
+        query += " LIMIT ?"
+        query_params.append(page_size + 1)
+
+    # row_factory 只設定在這個 cursor 上，請求共用的連線維持回傳 tuple
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute(query, query_params)
+    records = [public_record(row) for row in cursor.fetchall()]
+    has_more = page_size is not None and len(records) > page_size
+    if has_more:
+        records = records[:page_size]
+    sort_values = [record.pop('_sort_key') for record in records]
+
+    user_ids = [record['user_ID'] for record in records]
+    if meta_only:
+        summaries = fetch_curve_summaries(conn, user_ids)
+        for record in records:
+            record['summary'] = summaries[record['user_ID']]
+    else:
+        # 一次查詢取回所有符合記錄的效率數據
+        curves = fetch_curves(conn, user_ids, max_points=max_points)
+        for record in records:
+            record['efficiency_data'] = format_curve(curves[record['user_ID']], curve_format)
+
+    if page_size is None:
+        return jsonify(records)
+
+    total = conn.execute(f"SELECT COUNT(*) FROM {from_clause} {where}", params).fetchone()[0]
+    return jsonify({
+        'records': records,
+        'next_cursor': encode_search_cursor(sort_values[-1], records[-1]['user_ID']) if has_more else None,
+        'total': total,
+        'limit': page_size
+    })
+
+@app.route('/api/rankings')
+@cached_response
+def efficiency_rankings():
+    # 依指定負載點的效率排名，例如 /api/rankings?vin=12&vout=0.8&imax=200&load=100
+    # vin / vout: 曲線量測範圍需涵蓋目標值 ±10%；imax: 目標值 ±20%
+    # load: 負載點（imax 的百分比），需為 VR_SUMMARY_LOAD_POINTS 之一
+    # distinct=powerstage: 每個 powerstage 只保留效率最高的一筆
+    # 其餘參數與 /api/search 相同（powerstage_name、phase_count、tlvr…）
+    try:
+        load_percent = float(request.args.get('load', 100))
+        if load_percent not in SUMMARY_LOAD_PERCENTS:
+            raise ValueError(load_percent)
+        limit = min(max(int(request.args.get('limit', 20)), 1), SEARCH_MAX_PAGE_SIZE)
+        where, params = build_search_filters(request.args, has_search_index(get_db()))
+        where += " AND p.load_percent = ? AND p.efficiency IS NOT NULL"
+        params.append(load_percent)
+        for name in ('vin', 'vout'):
+            value = request.args.get(name)
+            if value:
+                value = float(value)
+                where += f" AND s.{name}_min <= ? AND s.{name}_max >= ?"
+                params.extend([value * 1.1, value * 0.9])
+        imax = request.args.get('imax')
+        if imax:
+            where += " AND i.imax BETWEEN ? AND ?"
+            params.extend([float(imax) * 0.8, float(imax) * 1.2])
+    except (ValueError, TypeError):
+        return jsonify({'error': '無效的排名參數'}), 400
+
+    rank_partition = "i.powerstage_name" if request.args.get('distinct') == 'powerstage' else "i.user_ID"
+    cursor = get_db().cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute(f'''
+        SELECT * FROM (
+            SELECT i.user_ID, i.series_number, i.user_name, i.pcb_name, i.powerstage_name, i.phase_count,
+                   i.frequency, i.inductor_value, i.tlvr, i.imax, i.upload_date,
+                   p.load_percent, p.iout, p.efficiency,
+                   s.peak_efficiency, s.full_load_efficiency, s.light_load_efficiency,
+                   ROW_NUMBER() OVER (PARTITION BY {rank_partition} ORDER BY p.efficiency DESC) AS partition_rank
+            FROM curve_load_points p
+            JOIN curve_summary s ON s.user_id = p.user_id
+            JOIN information_table i ON i.user_ID = p.user_id
+            {where}
+        )
+        WHERE partition_rank = 1
+        ORDER BY efficiency DESC, user_ID DESC
+        LIMIT ?
+    ''', params + [limit])
+    rankings = []
+    for rank, row in enumerate(cursor.fetchall(), start=1):
         record = dict(row)
-        # 查詢 efficiency_table 效率數據
-        eff_cursor = conn.execute('''
-            SELECT iout, efficiency, efficiency_remote, vin, vout
-            FROM efficiency_table 
-            WHERE user_id = ? 
-            ORDER BY iout
-        ''', (row['user_ID'],))
-        efficiency_data = []
-        for eff_row in eff_cursor.fetchall():
-            efficiency_data.append({
-                'iout': eff_row[0],
-                'efficiency': eff_row[1],
-                'efficiency_remote': eff_row[2],
-                'vin': eff_row[3],
-                'vout': eff_row[4]
-            })
-        record['efficiency_data'] = efficiency_data
-        records.append(record)
-    conn.close()
-    return jsonify(records)
+        del record['partition_rank']
+        record['rank'] = rank
+        rankings.append(record)
+    return jsonify({'load_percent': load_percent, 'rankings': rankings})
 
 @app.route('/api/efficiency-data/<int:user_id>')
+@cached_response
 def get_efficiency_data(user_id):
-    conn = sqlite3.connect('data/vr_efficiency.sqlite')
-    cursor = conn.execute('''
-        SELECT e.*, i.pcb_name, i.powerstage_name, i.phase_count
-        FROM efficiency_table e
-        JOIN information_table i ON e.user_id = i.user_ID
-        WHERE e.user_id = ?
-        ORDER BY e.iout
-    ''', (user_id,))
-    
-    data = []
+    # max_points: 以 LTTB 降採樣的最大點數
+    try:
+        curve_format = get_curve_format(request.args)
+        max_points = get_max_points(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db()
+    curve = fetch_curves(conn, [user_id], EFFICIENCY_DATA_FIELDS, max_points)[user_id]
     info = None
-    for row in cursor.fetchall():
-        if info is None:
+    if curve['iout']:
+        row = conn.execute('''
+            SELECT pcb_name, powerstage_name, phase_count
+            FROM information_table
+            WHERE user_ID = ?
+        ''', (user_id,)).fetchone()
+        if row:
             info = {
-                'pcb_name': row[10],
-                'powerstage_name': row[11], 
-                'phase_count': row[12]
+                'pcb_name': row[0],
+                'powerstage_name': row[1],
+                'phase_count': row[2]
             }
-        data.append({
-            'istep': row[1],
-            'vin': row[2],
-            'iin': row[3],
-            'vout': row[4],
-            'remote_vout_sense': row[5],
-            'iout': row[6],
-            'efficiency': row[7],
-            'efficiency_remote': row[8]
-        })
-    
-    conn.close()
-    return jsonify({'data': data, 'info': info})
+    if info is None:
+        # 與原本 JOIN 查詢相同：沒有對應的記錄時不回傳曲線
+        curve = {field: [] for field in EFFICIENCY_DATA_FIELDS}
+
+    return jsonify({'data': format_curve(curve, curve_format), 'info': info})
+
+# 匯出 CSV 時讀取 efficiency_table 的查詢，欄位順序同 MEASUREMENT_COLUMNS
+CSV_EXPORT_QUERY = '''
+    SELECT istep as "Istep", vin as "Vin", iin as "Iin", vout as "Vout",
+           remote_vout_sense as "remote Vout sense", iout as "Iout",
+           efficiency as "Efficiency", efficiency_remote as "Efficiency_remote"
+    FROM efficiency_table
+    WHERE user_id = ?
+    ORDER BY iout
+'''
+CSV_EXPORT_INFO_COLUMNS = 'pcb_name, powerstage_name, phase_count, frequency, inductor_value, imax, upload_date'
+# 串流匯出時每次從 cursor 讀取的列數
+CSV_EXPORT_BATCH_ROWS = 1000
+
+# 下載檔名：info 為 CSV_EXPORT_INFO_COLUMNS 的值，first_row 為量測資料的第一列
+def csv_filename(info, first_row):
+    vin = first_row[2] if len(first_row) > 2 else None
+    vout = first_row[4] if len(first_row) > 4 else None
+    pcb_name, powerstage_name, phase_count, frequency, inductor_value, imax, upload_date = info
+    # 處理 upload_date 格式
+    if not upload_date or str(upload_date).lower() == 'none' or str(upload_date).lower() == 'nan':
+        date_str = 'unknown'
+    else:
+        try:
+            date_raw = str(upload_date)
+            if ' ' in date_raw:
+                date_part, time_part = date_raw.split(' ')
+            else:
+                date_part, time_part = date_raw, '00:00:00'
+            if '-' in date_part:
+                dt = datetime.strptime(date_part, "%Y-%m-%d")
+            elif '/' in date_part:
+                dt = datetime.strptime(date_part, "%Y/%m/%d")
+            else:
+                dt = None
+            hm = time_part[:5].replace(':', '')
+            date_str = dt.strftime("%Y%m%d") + "-" + hm if dt else 'unknown'
+        except Exception:
+            date_str = 'unknown'
+    vin_str = f"{vin}vin" if vin is not None else "NA"
+    vout_str = f"{vout}vout" if vout is not None else "NA"
+    return f"{pcb_name}_{vin_str}_{vout_str}_{powerstage_name}_{phase_count}ph_{frequency}khz_{inductor_value}nH_{imax}Amps_{date_str}.csv"
+
+# 逐批將 iter_curve_rows 的資料列轉成 CSV 文字；first_batch 是已經讀出的第一批
+def iter_csv(first_batch, batches):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(MEASUREMENT_COLUMNS)
+    writer.writerows(first_batch)
+    for rows in batches:
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate()
+        writer.writerows(rows)
+    yield output.getvalue()
 
 @app.route('/download/csv/<int:series_number>')
 def download_csv(series_number):
+    # 以產生器逐批輸出 CSV；串流期間使用獨立連線，回應結束時關閉
+    conn = connect_db()
     try:
-        conn = sqlite3.connect('data/vr_efficiency.sqlite')
-        cursor = conn.cursor()
-        # 先從 information_table 取得 user_id
-        cursor.execute('SELECT user_ID, pcb_name, powerstage_name, phase_count, frequency, inductor_value, imax, upload_date FROM information_table WHERE series_number = ?', (series_number,))
-        info = cursor.fetchone()
-        if not info:
-            return jsonify({'error': 'No data found'}), 404
-        
-        user_id = info[0]
-        # 只取得 efficiency_table 的必要欄位，並使用上傳時的欄位名稱
-        cursor.execute('''
-            SELECT istep as "Istep", vin as "Vin", iin as "Iin", vout as "Vout", 
-                   remote_vout_sense as "remote Vout sense", iout as "Iout", 
-                   efficiency as "Efficiency", efficiency_remote as "Efficiency_remote"
-            FROM efficiency_table
-            WHERE user_id = ? 
-            ORDER BY iout
-        ''', (user_id,))
-        rows = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        # 取得第一筆 vin/vout
-        vin, vout = None, None
-        if rows:
-            vin = rows[0][2] if len(rows[0]) > 2 else None
-            vout = rows[0][4] if len(rows[0]) > 4 else None
+        info = conn.execute(f'SELECT user_ID, {CSV_EXPORT_INFO_COLUMNS} FROM information_table WHERE series_number = ?',
+                            (series_number,)).fetchone()
+        batches = iter_curve_rows(conn, info[0]) if info else iter(())
+        first_batch = next(batches, None)
+    except Exception as e:
         conn.close()
-        if not rows:
-            return jsonify({'error': 'No data found'}), 404
+        return jsonify({'error': f'Failed to download CSV: {str(e)}'}), 500
+    if not first_batch:
+        conn.close()
+        return jsonify({'error': 'No data found'}), 404
 
-        pcb_name, powerstage_name, phase_count, frequency, inductor_value, imax, upload_date = info[1:]
-        # 處理 upload_date 格式
-        if not upload_date or str(upload_date).lower() == 'none' or str(upload_date).lower() == 'nan':
-            date_str = 'unknown'
-        else:
+    response = app.response_class(iter_csv(first_batch, batches), mimetype='text/csv')
+    response.call_on_close(conn.close)
+    response.headers["Content-Disposition"] = f"attachment; filename={csv_filename(info[1:], first_batch[0])}"
+    return response
+
+# 串流回應的輸出目標（zipfile、Parquet / Arrow writer）：寫入的位元組先暫存，由 drain() 取出送給客戶端
+# 只能循序寫入，tell() 回傳已寫入的位元組數
+class ResponseStream(io.RawIOBase):
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+@app.route('/download/zip')
+def download_zip():
+    # series_numbers=1,2,3 或 /api/search 的篩選條件（可同時使用），將每筆記錄的 CSV 串流打包成 ZIP
+    # ZIP 內的檔名與 /download/csv 相同，重複時加上 series_number
+    try:
+        series_numbers = [int(s) for s in request.args.get('series_numbers', '').split(',') if s.strip()]
+        where, params = build_search_filters(request.args, has_search_index(get_db()))
+    except (ValueError, TypeError):
+        return jsonify({'error': '無效的匯出參數'}), 400
+    if series_numbers:
+        where += " AND i.series_number IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(series_numbers))
+    elif not params:
+        return jsonify({'error': '請提供 series_numbers 或搜尋條件'}), 400
+
+    conn = connect_db()
+    infos = conn.execute(f'''
+        SELECT i.user_ID, i.series_number, {CSV_EXPORT_INFO_COLUMNS}
+        FROM information_table i {where}
+        ORDER BY i.series_number
+    ''', params).fetchall()
+    if not infos:
+        conn.close()
+        return jsonify({'error': 'No data found'}), 404
+
+    def generate():
+        stream = ResponseStream()
+        names = set()
+        with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED, compresslevel=GZIP_LEVEL) as archive:
+            for info in infos:
+                batches = iter_curve_rows(conn, info[0])
+                first_batch = next(batches, None)
+                if not first_batch:
+                    continue
+                filename = csv_filename(info[2:], first_batch[0])
+                if filename in names:
+                    filename = f'{filename[:-len(".csv")]}_{info[1]}.csv'
+                names.add(filename)
+                with archive.open(filename, 'w') as entry:
+                    for text in iter_csv(first_batch, batches):
+                        entry.write(text.encode('utf-8'))
+                        data = stream.drain()
+                        if data:
+                            yield data
+        yield stream.drain()
+
+    response = app.response_class(generate(), mimetype='application/zip')
+    response.call_on_close(conn.close)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    response.headers['Content-Disposition'] = f'attachment; filename=vr_efficiency_csv_{timestamp}.zip'
+    return response
+
+# 匯出整個資料集時每批讀取的量測點數（即 Parquet row group / Arrow record batch 的大小）
+DATASET_CHUNK_ROWS = int(os.environ.get('VR_DATASET_CHUNK_ROWS', 16384))
+# format 參數：(mimetype, 副檔名)
+DATASET_FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+# 依 SQLite 的型別親和性規則，將欄位宣告型別對應到 Arrow 型別
+def arrow_type(pa, declared_type):
+    declared_type = (declared_type or '').upper()
+    if 'INT' in declared_type:
+        return pa.int64()
+    if any(name in declared_type for name in ('REAL', 'FLOA', 'DOUB')):
+        return pa.float64()
+    return pa.string()
+
+def to_arrow_array(pa, values, value_type):
+    if pa.types.is_string(value_type):
+        values = [None if value is None else str(value) for value in values]
+    try:
+        return pa.array(values, type=value_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # SQLite 允許欄位存放與宣告型別不同的值，無法轉換者以 null 匯出
+        convert = float if pa.types.is_floating(value_type) else int
+        converted = []
+        for value in values:
             try:
-                date_raw = str(upload_date)
-                if ' ' in date_raw:
-                    date_part, time_part = date_raw.split(' ')
-                else:
-                    date_part, time_part = date_raw, '00:00:00'
-                if '-' in date_part:
-                    dt = datetime.strptime(date_part, "%Y-%m-%d")
-                elif '/' in date_part:
-                    dt = datetime.strptime(date_part, "%Y/%m/%d")
+                converted.append(None if value is None else convert(value))
+            except (TypeError, ValueError):
+                converted.append(None)
+        return pa.array(converted, type=value_type)
+
+# packed 記錄的 record batch：information_table 欄位依點數重複，量測欄位直接由 BLOB 轉換
+# records 為 (information_table 欄位..., point_count, data)
+def packed_record_batch(pa, schema, info_count, records):
+    counts = [record[-2] for record in records]
+    repeat = pa.array(np.repeat(np.arange(len(records)), counts))
+    arrays = [to_arrow_array(pa, [record[index] for record in records], field.type).take(repeat)
+              for index, field in enumerate(list(schema)[:info_count])]
+    for field in list(schema)[info_count:]:
+        if field.name in PACKED_CURVE_FIELDS:
+            index = PACKED_CURVE_FIELDS.index(field.name)
+            values = np.concatenate([unpack_curve(record[-1], record[-2])[index] for record in records])
+            arrays.append(pa.array(values).cast(field.type))
+        else:
+            arrays.append(pa.nulls(sum(counts), field.type))
+    return pa.record_batch(arrays, schema=schema)
+
+@app.route('/download/dataset')
+def download_dataset():
+    # 匯出量測點與所屬記錄的 information_table 欄位（每個量測點一列），供離線分析使用
+    # format: parquet（預設）或 arrow（Arrow IPC stream）；可搭配 /api/search 的篩選條件
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return jsonify({'error': '伺服器未安裝 pyarrow，無法匯出資料集'}), 501
+    dataset_format = request.args.get('format', 'parquet')
+    if dataset_format not in DATASET_FORMATS:
+        return jsonify({'error': f'format 必須是 {", ".join(DATASET_FORMATS)} 之一'}), 400
+    try:
+        where, params = build_search_filters(request.args, has_search_index(get_db()))
+    except (ValueError, TypeError):
+        return jsonify({'error': '無效的匯出參數'}), 400
+
+    conn = connect_db()
+    info_columns = [row for row in conn.execute('PRAGMA table_info(information_table)').fetchall()
+                    if row[1] not in INTERNAL_INFO_COLUMNS]
+    info_names = {row[1] for row in info_columns}
+    # 量測點的主鍵與 user_id 不匯出（已有 information_table 的 user_ID）
+    point_columns = [row for row in conn.execute('PRAGMA table_info(efficiency_table)').fetchall()
+                     if row[1] not in ('series_number', 'user_id') and row[1] not in info_names]
+    schema = pa.schema([(row[1], arrow_type(pa, row[2])) for row in info_columns + point_columns])
+    # 逐筆記錄依 user_ID 讀取，每筆的量測點各自查詢（與 CSV 下載相同），
+    # 避免整個資料集 JOIN 後 ORDER BY 在記憶體中排序全部量測點
+    records = conn.execute(f'''
+        SELECT {', '.join(f'i."{row[1]}"' for row in info_columns)}, pc.point_count, pc.data
+        FROM information_table i LEFT JOIN packed_curve pc ON pc.user_id = i.user_ID
+        {where}
+        ORDER BY i.user_ID
+    ''', params)
+    points_query = f'''
+        SELECT {', '.join(f'"{row[1]}"' for row in point_columns)} FROM efficiency_table
+        WHERE user_id = ? ORDER BY iout
+    '''
+    info_count = len(info_columns)
+    user_index = [row[1] for row in info_columns].index('user_ID')
+
+    def generate():
+        stream = ResponseStream()
+        if dataset_format == 'parquet':
+            writer = pq.ParquetWriter(stream, schema)
+        else:
+            writer = pa.ipc.new_stream(stream, schema)
+
+        # rows 記錄累積量測點、packed 記錄累積整筆，達到 DATASET_CHUNK_ROWS 點或換成另一種記錄時寫成一批
+        def write_rows(rows):
+            arrays = [to_arrow_array(pa, values, field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+
+        with writer:
+            rows, packed, packed_points = [], [], 0
+            for record in records:
+                if record[-1] is not None:
+                    if rows:
+                        write_rows(rows)
+                        rows = []
+                    packed.append(record)
+                    packed_points += record[-2]
+                    if packed_points < DATASET_CHUNK_ROWS:
+                        continue
+                    writer.write_batch(packed_record_batch(pa, schema, info_count, packed))
+                    packed, packed_points = [], 0
                 else:
-                    dt = None
-                hm = time_part[:5].replace(':', '')
-                date_str = dt.strftime("%Y%m%d") + "-" + hm if dt else 'unknown'
-            except Exception:
-                date_str = 'unknown'
-        vin_str = f"{vin}vin" if vin is not None else "NA"
-        vout_str = f"{vout}vout" if vout is not None else "NA"
-        filename = f"{pcb_name}_{vin_str}_{vout_str}_{powerstage_name}_{phase_count}ph_{frequency}khz_{inductor_value}nH_{imax}Amps_{date_str}.csv"
-
-        # 產生 CSV
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(columns)
-        writer.writerows(rows)
-        output.seek(0)
+                    if packed:
+                        writer.write_batch(packed_record_batch(pa, schema, info_count, packed))
+                        packed, packed_points = [], 0
+                    info = record[:info_count]
+                    rows.extend(info + point for point in conn.execute(points_query, (info[user_index],)))
+                    if len(rows) < DATASET_CHUNK_ROWS:
+                        continue
+                    write_rows(rows)
+                    rows = []
+                yield stream.drain()
+            if rows:
+                write_rows(rows)
+            if packed:
+                writer.write_batch(packed_record_batch(pa, schema, info_count, packed))
+        yield stream.drain()
 
-        response = make_response(output.getvalue())
-        response.headers["Content-Disposition"] = f"attachment; filename={filename}"
-        response.headers["Content-type"] = "text/csv"
-        return response
-    except Exception as e:
-        return jsonify({'error': f'Failed to download CSV: {str(e)}'}), 500
+    mimetype, extension = DATASET_FORMATS[dataset_format]
+    response = app.response_class(generate(), mimetype=mimetype)
+    response.call_on_close(conn.close)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    response.headers['Content-Disposition'] = f'attachment; filename=vr_efficiency_dataset_{timestamp}.{extension}'
+    return response
+
+# 備份檔名前綴與保留數量（VR_BACKUP_RETENTION，預設 0 表示全部保留，設定後才刪除較舊的備份）
+BACKUP_PREFIX = 'vr_efficiency_backup_'
+RESTORE_BACKUP_PREFIX = 'backup_before_restore_'
+BACKUP_RETENTION = int(os.environ.get('VR_BACKUP_RETENTION', 0))
+# 線上備份每一步複製的頁數，步驟之間讓出給其他請求
+BACKUP_PAGES_PER_STEP = int(os.environ.get('VR_BACKUP_PAGES_PER_STEP', 1024))
+BACKUP_CHUNK_SIZE = 1024 * 1024
+
+# 以 SQLite online backup API 分段複製資料庫，複製期間其他連線仍可讀寫
+def online_backup(target_path, progress_message='備份資料庫'):
+    source = connect_db()
+    target = sqlite3.connect(target_path)
+    try:
+        # 先開啟讀取交易固定 WAL 快照；否則其他連線每次寫入都會讓備份從頭開始
+        source.execute('BEGIN')
+        source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        def progress(status, remaining, total):
+            if progress_message:
+                report_progress(1 - remaining / total if total else 1, progress_message)
+            yield_to_requests()
+        source.backup(target, pages=BACKUP_PAGES_PER_STEP, progress=progress)
+        source.rollback()
+    finally:
+        target.close()
+        source.close()
+
+# data/ 目錄中的備份檔，新到舊排序（檔名含時間記號）
+def list_backups(prefix):
+    data_dir = get_data_dir()
+    names = [name for name in os.listdir(data_dir)
+             if name.startswith(prefix) and name.endswith(('.sqlite', '.sqlite.gz'))]
+    return [os.path.join(data_dir, name) for name in sorted(names, reverse=True)]
+
+# 只保留最新的 BACKUP_RETENTION 個備份
+def prune_backups(prefix):
+    if BACKUP_RETENTION <= 0:
+        return
+    for path in list_backups(prefix)[BACKUP_RETENTION:]:
+        os.remove(path)
+
+# 分段讀取備份檔回傳給客戶端，compress 時邊讀邊以 gzip 壓縮
+def stream_backup(path, compress):
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(BACKUP_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield compressor.compress(chunk) if compressor else chunk
+    if compressor:
+        yield compressor.flush()
 
 @app.route('/admin/backup')
 @admin_required
+@background_job('backup')
 def backup_database():
+    # compress=gzip: 以 gzip 壓縮串流下載
+    # keep=0: 不在 data/ 保留備份檔，下載完即刪除
+    # async=1: 備份保存在 data/，完成後由 result 的 download_url 下載
+    compress = request.args.get('compress') == 'gzip'
+    keep = request.args.get('keep', '1') != '0' or g.get('job_id') is not None
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_filename = f'vr_efficiency_backup_{timestamp}.sqlite'
-    
-    # 複製資料庫檔案
-    shutil.copy2('data/vr_efficiency.sqlite', f'data/{backup_filename}')
-    
-    return send_file(f'data/{backup_filename}', as_attachment=True, download_name=backup_filename)
+    backup_filename = f'{BACKUP_PREFIX}{timestamp}.sqlite'
+
+    if keep:
+        backup_path = os.path.join(get_data_dir(), backup_filename)
+    else:
+        fd, backup_path = tempfile.mkstemp(suffix='.sqlite', dir=get_data_dir())
+        os.close(fd)
+    online_backup(backup_path)
+    if keep:
+        prune_backups(BACKUP_PREFIX)
+    if g.get('job_id'):
+        return jsonify({
+            'success': True,
+            'filename': backup_filename,
+            'size': os.path.getsize(backup_path),
+            'download_url': url_for('download_backup', filename=backup_filename, compress=request.args.get('compress'))
+        })
+
+    response = app.response_class(
+        stream_backup(backup_path, compress),
+        mimetype='application/gzip' if compress else 'application/x-sqlite3'
+    )
+    if not compress:
+        response.content_length = os.path.getsize(backup_path)
+    if not keep:
+        # 回應關閉時刪除（客戶端在開始傳送前中斷時，產生器不會執行，不能在其中刪除）
+        response.call_on_close(lambda: os.remove(backup_path))
+    download_name = backup_filename + ('.gz' if compress else '')
+    response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+    return response
+
+@app.route('/admin/backups/<filename>')
+@admin_required
+def download_backup(filename):
+    # 下載 data/ 中保存的備份（例如背景備份的結果），compress=gzip 時壓縮串流
+    paths = {os.path.basename(path): path for path in list_backups(BACKUP_PREFIX) + list_backups(RESTORE_BACKUP_PREFIX)}
+    if filename not in paths:
+        return jsonify({'error': '找不到備份檔'}), 404
+    compress = request.args.get('compress') == 'gzip' and not filename.endswith('.gz')
+    response = app.response_class(
+        stream_backup(paths[filename], compress),
+        mimetype='application/gzip' if compress else 'application/x-sqlite3'
+    )
+    if not compress:
+        response.content_length = os.path.getsize(paths[filename])
+    download_name = filename + ('.gz' if compress else '')
+    response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+    return response
+
+# 容器與負載平衡器的健康檢查：只確認資料庫可以讀取，不產生頁面
+@app.route('/healthz')
+def healthz():
+    try:
+        get_db().execute('SELECT 1 FROM app_meta LIMIT 1').fetchone()
+    except sqlite3.Error as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 503
+    return jsonify({'status': 'ok'})
+
+@app.route('/admin/status')
+def admin_status():
+    # 前端用來判斷是否已登入管理者；管理者另外回傳目前的備份檔
+    if not session.get('is_admin'):
+        return jsonify({'is_admin': False})
+    backups = [{
+        'name': os.path.basename(path),
+        'size': os.path.getsize(path),
+        'modified': datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+    } for path in list_backups(BACKUP_PREFIX)]
+    return jsonify({'is_admin': True, 'backups': backups, 'backup_retention': BACKUP_RETENTION})
+
+# 同一時間只允許一個還原
+restore_lock = native_lock()
+# 還原的備份至少需包含 init_db 建立的這些資料表與欄位，其餘資料表由 init_db 補建
+RESTORE_REQUIRED_TABLES = ('information_table', 'efficiency_table')
+
+def expected_table_columns():
+    conn = sqlite3.connect(':memory:')
+    create_tables(conn.cursor())
+    columns = {table: {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+               for table in RESTORE_REQUIRED_TABLES}
+    conn.close()
+    return columns
+
+# 檢查待還原的資料庫，回傳錯誤訊息（通過時回傳 None）
+def validate_restore_database(conn):
+    try:
+        result = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    except sqlite3.DatabaseError as e:
+        return f'不是有效的 SQLite 資料庫: {e}'
+    if result != ['ok']:
+        return f'資料庫完整性檢查失敗: {"; ".join(result[:5])}'
+    for table, columns in expected_table_columns().items():
+        actual = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if not actual:
+            return f'缺少資料表 {table}'
+        # 之後新增的欄位由 init_db 補上
+        missing = columns - actual - set(ADDED_COLUMNS.get(table, ()))
+        if missing:
+            return f'{table} 缺少欄位: {", ".join(sorted(missing))}'
+    return None
+
+# 將上傳的備份檔分段寫入 data/ 下的暫存檔，.gz 邊讀邊解壓
+def save_restore_upload(file):
+    fd, path = tempfile.mkstemp(suffix='.sqlite', dir=get_data_dir())
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            source = gzip.GzipFile(fileobj=file.stream) if file.filename.endswith('.gz') else file.stream
+            shutil.copyfileobj(source, target, BACKUP_CHUNK_SIZE)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+# 以 backup API 在單一寫入交易中將資料庫內容複製到使用中的資料庫
+# 其他請求的連線不需關閉，只會看到還原前或還原後的完整內容
+def swap_in_database(source):
+    target = connect_db()
+    try:
+        page_size = target.execute('PRAGMA page_size').fetchone()[0]
+        if source.execute('PRAGMA page_size').fetchone()[0] != page_size:
+            # WAL 模式的目的資料庫無法改變頁面大小，先將暫存檔轉為相同頁面大小
+            source.execute('PRAGMA journal_mode = DELETE')
+            source.execute(f'PRAGMA page_size = {int(page_size)}')
+            source.execute('VACUUM')
+        source.backup(target)
+    finally:
+        target.close()
 
 @app.route('/admin/restore', methods=['POST'])
 @admin_required
+@background_job('restore')
 def restore_database():
     if 'file' not in request.files:
         return jsonify({'error': '沒有檔案'}), 400
     
     file = request.files['file']
-    if not file.filename.endswith('.sqlite'):
+    if not file.filename.endswith(('.sqlite', '.sqlite.gz')):
         return jsonify({'error': '請選擇 SQLite 檔案'}), 400
-    
+
+    if not restore_lock.acquire(blocking=False):
+        return jsonify({'error': '另一個還原正在進行中'}), 409
+
+    temp_path = None
     try:
-        # 備份當前資料庫
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        shutil.copy2('data/vr_efficiency.sqlite', f'data/backup_before_restore_{timestamp}.sqlite')
-        
-        # 還原資料庫
-        file.save('data/vr_efficiency.sqlite')
+        try:
+            temp_path = save_restore_upload(file)
+        except (OSError, EOFError) as e:
+            return jsonify({'error': f'無法讀取備份檔: {str(e)}'}), 400
+
+        # 在暫存檔上檢查，不影響使用中的資料庫
+        report_progress(0.1, '檢查備份檔')
+        source = sqlite3.connect(temp_path)
+        try:
+            error = validate_restore_database(source)
+            if error:
+                return jsonify({'error': error}), 400
+
+            # 備份當前資料庫
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            previous_version = get_data_version(get_db())
+            close_db(None)
+            report_progress(0.3, '備份目前的資料庫')
+            online_backup(os.path.join(get_data_dir(), f'{RESTORE_BACKUP_PREFIX}{timestamp}.sqlite'), None)
+            prune_backups(RESTORE_BACKUP_PREFIX)
+
+            report_progress(0.6, '替換資料庫')
+            swap_in_database(source)
+        finally:
+            source.close()
+
+        # 補建新版資料表、全文索引與曲線摘要
+        report_progress(0.8, '更新索引與摘要')
+        init_db()
+
+        # 還原後的資料版本必須大於還原前，讓所有快取失效
+        conn = get_db()
+        bump_data_version(conn, at_least=previous_version)
+        conn.commit()
+        query_cache.clear()
         
         return jsonify({'success': True, 'message': '資料庫還原成功'})
     except Exception as e:
         return jsonify({'error': f'還原失敗: {str(e)}'}), 500
+    finally:
+        restore_lock.release()
+        if temp_path:
+            for path in (temp_path, temp_path + '-wal', temp_path + '-shm', temp_path + '-journal'):
+                if os.path.exists(path):
+                    os.remove(path)
 
 @app.route('/admin/table-structure/<table_name>')
 @admin_required
@@ -430,7 +2402,7 @@ def get_table_structure(table_name):
     if table_name not in ['efficiency_table', 'information_table']:
         return jsonify({'error': '無效的資料表名稱'}), 400
     
-    conn = sqlite3.connect('data/vr_efficiency.sqlite')
+    conn = get_db()
     cursor = conn.execute(f"PRAGMA table_info({table_name})")
     columns = []
     for row in cursor.fetchall():
@@ -442,7 +2414,6 @@ def get_table_structure(table_name):
             'dflt_value': row[4],
             'pk': row[5]
         })
-    conn.close()
     
     return jsonify(columns)
 
@@ -455,123 +2426,323 @@ def add_column():
     
     if table_name not in ['efficiency_table', 'information_table']:
         return jsonify({'error': '無效的資料表名稱'}), 400
+    # 欄位名稱與型別直接組入 SQL，只允許一般識別字
+    if not IDENTIFIER_PATTERN.fullmatch(column_name or '') or not IDENTIFIER_PATTERN.fullmatch(column_type or ''):
+        return jsonify({'error': '無效的欄位名稱或型別'}), 400
     
     try:
-        conn = sqlite3.connect('data/vr_efficiency.sqlite')
+        conn = get_db()
         cursor = conn.cursor()
+        # ADD COLUMN 只修改資料表定義，不需複製資料
         cursor.execute(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}')
+        bump_data_version(conn)
         conn.commit()
-        conn.close()
         
         return jsonify({'success': True, 'message': f'欄位 {column_name} 新增成功'})
     except Exception as e:
         return jsonify({'error': f'新增欄位失敗: {str(e)}'}), 500
 
+# 原生 ALTER TABLE DROP COLUMN 需要 SQLite 3.35 以上，較舊的版本改為分批重建資料表
+NATIVE_DROP_COLUMN = sqlite3.sqlite_version_info >= (3, 35, 0)
+# 重建資料表時每批複製的列數，批次之間釋放寫入鎖
+SCHEMA_CHUNK_ROWS = int(os.environ.get('VR_SCHEMA_CHUNK_ROWS', 50000))
+IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+# 將 CREATE TABLE 語句拆成 (開頭到左括號, [欄位與限制定義], 右括號到結尾)
+def split_table_definitions(create_sql):
+    start = create_sql.index('(')
+    definitions = []
+    depth = 0
+    quote = None
+    current = start + 1
+    for pos in range(start, len(create_sql)):
+        ch = create_sql[pos]
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in '\'"`[':
+            quote = ']' if ch == '[' else ch
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+            if depth == 0:
+                definitions.append(create_sql[current:pos].strip())
+                return create_sql[:start + 1], definitions, create_sql[pos:]
+        elif ch == ',' and depth == 1:
+            definitions.append(create_sql[current:pos].strip())
+            current = pos + 1
+    raise ValueError('無法解析資料表定義')
+
+def definition_name(definition):
+    return definition.split()[0].strip('"`[]').lower()
+
+# 以原本的 DDL（去掉指定欄位）重建資料表，保留主鍵、AUTOINCREMENT 序號、索引與觸發器
+# 資料分批複製，每批之間其他連線仍可寫入；複製期間的異動由暫時的觸發器同步到新資料表
+def rebuild_without_column(conn, table_name, column_name):
+    temp_table = f'{table_name}_rebuild'
+    create_sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone()[0]
+    dependents = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table_name,))]
+    _, definitions, tail = split_table_definitions(create_sql)
+    kept = [d for d in definitions if definition_name(d) != column_name.lower()]
+    columns = ', '.join(['rowid'] + [c for c in get_table_columns(table_name) if c != column_name])
+    new_values = columns.replace('rowid', 'new.rowid', 1).replace(', ', ', new.')
+
+    conn.execute(f'DROP TABLE IF EXISTS {temp_table}')
+    conn.execute(f'CREATE TABLE {temp_table} (' + ', '.join(kept) + tail)
+    conn.execute(f'''
+        CREATE TRIGGER {temp_table}_insert AFTER INSERT ON {table_name} BEGIN
+            INSERT OR REPLACE INTO {temp_table} ({columns}) VALUES ({new_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER {temp_table}_update AFTER UPDATE ON {table_name} BEGIN
+            DELETE FROM {temp_table} WHERE rowid = old.rowid;
+            INSERT OR REPLACE INTO {temp_table} ({columns}) VALUES ({new_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER {temp_table}_delete AFTER DELETE ON {table_name} BEGIN
+            DELETE FROM {temp_table} WHERE rowid = old.rowid;
+        END
+    ''')
+    conn.commit()
+
+    try:
+        total = conn.execute(f'SELECT COUNT(*) FROM {table_name}').fetchone()[0]
+        copied = 0
+        last_rowid = None
+        while True:
+            lower = '' if last_rowid is None else 'WHERE rowid > ?'
+            lower_params = () if last_rowid is None else (last_rowid,)
+            upper = conn.execute(f'''
+                SELECT MAX(rowid), COUNT(*) FROM (
+                    SELECT rowid FROM {table_name} {lower} ORDER BY rowid LIMIT ?
+                )
+            ''', lower_params + (SCHEMA_CHUNK_ROWS,)).fetchone()
+            if upper[0] is None:
+                break
+            # 觸發器已同步的列較新，不覆蓋
+            conn.execute(f'''
+                INSERT OR IGNORE INTO {temp_table} ({columns})
+                SELECT {columns} FROM {table_name} {lower or 'WHERE 1=1'} AND rowid <= ?
+            ''', lower_params + (upper[0],))
+            conn.commit()
+            last_rowid = upper[0]
+            copied += upper[1]
+            report_progress(0.9 * copied / total if total else 0.9, f'複製 {table_name}（{copied}/{total}）')
+            yield_to_requests()
+
+        # 最後在單一交易中替換資料表並重建索引與觸發器
+        report_progress(0.9, '替換資料表')
+        conn.execute('BEGIN IMMEDIATE')
+        sequence = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table_name,)).fetchone()
+        conn.execute(f'DROP TABLE {table_name}')
+        conn.execute(f'ALTER TABLE {temp_table} RENAME TO {table_name}')
+        for sql in dependents:
+            try:
+                conn.execute(sql)
+            except sqlite3.OperationalError:
+                # 參照已刪除欄位的索引或觸發器一併移除
+                pass
+        # 保留 AUTOINCREMENT 序號，已刪除的編號不會被重複使用
+        if sequence:
+            updated = conn.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?',
+                                   (sequence[0], table_name)).rowcount
+            if not updated:
+                conn.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table_name, sequence[0]))
+    except Exception:
+        # 失敗時移除同步用的觸發器與未完成的新資料表，原資料表保持不變
+        conn.rollback()
+        for suffix in ('insert', 'update', 'delete'):
+            conn.execute(f'DROP TRIGGER IF EXISTS {temp_table}_{suffix}')
+        conn.execute(f'DROP TABLE IF EXISTS {temp_table}')
+        conn.commit()
+        raise
+
 @app.route('/admin/remove-column', methods=['POST'])
 @admin_required
+@background_job('remove_column')
 def remove_column():
     table_name = request.json.get('table_name')
     column_name = request.json.get('column_name')
     
     if table_name not in ['efficiency_table', 'information_table']:
         return jsonify({'error': '無效的資料表名稱'}), 400
+    if column_name not in get_table_columns(table_name):
+        return jsonify({'error': f'欄位 {column_name} 不存在'}), 404
+    # init_db 建立的欄位為上傳與還原所需，只能刪除管理者新增的欄位
+    if column_name in expected_table_columns()[table_name]:
+        return jsonify({'error': f'欄位 {column_name} 為系統欄位，無法刪除'}), 400
     
     try:
-        conn = sqlite3.connect('data/vr_efficiency.sqlite')
-        cursor = conn.cursor()
-        
-        # SQLite 不支援直接刪除欄位，需要重建資料表
-        # 1. 獲取當前資料表結構
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = [row[1] for row in cursor.fetchall() if row[1] != column_name]
-        
-        # 2. 創建暫存資料表
-        temp_table = f"{table_name}_temp"
-        cursor.execute(f"SELECT sql FROM sqlite_master WHERE name='{table_name}'")
-        create_sql = cursor.fetchone()[0]
-        
-        # 修改 CREATE 語句以移除欄位（簡化版本，實際可能需要更複雜的解析）
-        new_create_sql = create_sql.replace(table_name, temp_table)
-        
-        # 3. 複製資料（排除指定欄位）
-        columns_str = ', '.join(columns)
-        cursor.execute(f"CREATE TABLE {temp_table} AS SELECT {columns_str} FROM {table_name}")
-        
-        # 4. 刪除原資料表並重命名
-        cursor.execute(f"DROP TABLE {table_name}")
-        cursor.execute(f"ALTER TABLE {temp_table} RENAME TO {table_name}")
+        conn = get_db()
+        started = time.perf_counter()
+        method = 'drop_column'
+        try:
+            if not NATIVE_DROP_COLUMN:
+                raise sqlite3.OperationalError('DROP COLUMN not supported')
+            report_progress(0.1, f'刪除欄位 {column_name}')
+            conn.execute(f'ALTER TABLE {table_name} DROP COLUMN {column_name}')
+        except sqlite3.OperationalError:
+            # 不支援原生 DROP COLUMN，或欄位被限制條件參照時改為重建
+            conn.rollback()
+            method = 'rebuild'
+            rebuild_without_column(conn, table_name, column_name)
         
+        bump_data_version(conn)
         conn.commit()
-        conn.close()
         
-        return jsonify({'success': True, 'message': f'欄位 {column_name} 刪除成功'})
+        return jsonify({
+            'success': True,
+            'message': f'欄位 {column_name} 刪除成功',
+            'method': method,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+        })
     except Exception as e:
+        get_db().rollback()
         return jsonify({'error': f'刪除欄位失敗: {str(e)}'}), 500
 
 @app.route('/admin/delete-record/<int:series_number>', methods=['DELETE'])
 @admin_required
 def delete_record_by_series_number(series_number):
     try:
-        conn = sqlite3.connect('data/vr_efficiency.sqlite')
+        conn = get_db()
         cursor = conn.cursor()
 
-        # 刪除 efficiency_table 中的資料
-        cursor.execute('DELETE FROM efficiency_table WHERE series_number = ?', (series_number,))
-
-        # 檢查是否有對應的資料被刪除
-        if cursor.rowcount == 0:
-            conn.close()
+        # 只以 information_table 的 series_number 找記錄（曲線中其他量測點的編號不代表記錄），再以 user_id 刪除整條曲線
+        cursor.execute('SELECT user_ID FROM information_table WHERE series_number = ?', (series_number,))
+        user_ids = [row[0] for row in cursor.fetchall()]
+        if not user_ids:
             return jsonify({'error': 'No record found with the given Series Number'}), 404
 
-        # 刪除 information_table 中的資料
-        cursor.execute('DELETE FROM information_table WHERE series_number = ?', (series_number,))
+        ids = json.dumps(user_ids)
+        cursor.execute('DELETE FROM efficiency_table WHERE user_id IN (SELECT value FROM json_each(?))', (ids,))
+        cursor.execute('DELETE FROM packed_curve WHERE user_id IN (SELECT value FROM json_each(?))', (ids,))
+        cursor.execute('DELETE FROM information_table WHERE user_ID IN (SELECT value FROM json_each(?))', (ids,))
+        refresh_curve_summaries(conn, user_ids)
 
+        bump_data_version(conn)
         conn.commit()
-        conn.close()
 
         return jsonify({'success': True, 'message': 'Record deleted successfully'})
     except Exception as e:
         return jsonify({'error': f'Failed to delete record: {str(e)}'}), 500
 
+# 合併重複記錄時不比較的 information_table 欄位；其餘欄位（含管理者新增的欄位）都相同才視為同一筆記錄
+DEDUPE_IGNORED_COLUMNS = ('user_ID', 'series_number', 'content_hash', 'upload_date', 'notice')
+
+# 合併重複記錄：內容雜湊與記錄資訊都相同時，保留最早上傳的一筆，其餘記錄的備註併入後刪除
+# 內容相同但記錄資訊不同的記錄不合併，列在 conflicts 中；dry_run=1 時只列出
+@app.route('/admin/dedupe', methods=['POST'])
+@admin_required
+@background_job('dedupe')
+def dedupe_records():
+    dry_run = request.args.get('dry_run') == '1'
+    try:
+        conn = get_db()
+        if not dry_run:
+            # 分組查詢、備註合併與刪除在同一個寫入交易中，期間其他連線無法修改記錄
+            conn.execute('BEGIN IMMEDIATE')
+        report_progress(0.1, '計算內容雜湊')
+        backfill_content_hashes(conn)
+        meta_columns = [row[1] for row in conn.execute('PRAGMA table_info(information_table)')
+                        if row[1] not in DEDUPE_IGNORED_COLUMNS]
+        rows = conn.execute(f'''
+            SELECT content_hash, user_ID, series_number, upload_date, notice, {', '.join(meta_columns)}
+            FROM information_table
+            WHERE content_hash IN (
+                SELECT content_hash FROM information_table
+                WHERE content_hash IS NOT NULL GROUP BY content_hash HAVING COUNT(*) > 1
+            )
+            ORDER BY content_hash, user_ID
+        ''').fetchall()
+
+        groups = []
+        conflicts = []
+        removed_ids = []
+        for digest, members in groupby(rows, key=itemgetter(0)):
+            members = list(members)
+            # 記錄資訊不同的記錄：列出各筆不同的欄位值
+            differing = [column for index, column in enumerate(meta_columns, start=5)
+                         if len({member[index] for member in members}) > 1]
+            if differing:
+                conflicts.append({
+                    'content_hash': digest,
+                    'columns': differing,
+                    'records': [{'user_id': member[1], 'series_number': member[2],
+                                 'values': {column: member[5 + meta_columns.index(column)] for column in differing}}
+                                for member in members]
+                })
+            by_metadata = {}
+            for member in members:
+                by_metadata.setdefault(member[5:], []).append(member)
+            for kept, *duplicates in by_metadata.values():
+                if not duplicates:
+                    continue
+                _, user_id, series_number, _, notice = kept[:5]
+                notices = list(dict.fromkeys(n for n in [notice] + [d[4] for d in duplicates] if n))
+                groups.append({
+                    'content_hash': digest,
+                    'kept': {'user_id': user_id, 'series_number': series_number, 'upload_date': kept[3]},
+                    'removed': [{'user_id': d[1], 'series_number': d[2], 'upload_date': d[3]} for d in duplicates],
+                    'notice': '; '.join(notices)
+                })
+                removed_ids.extend(d[1] for d in duplicates)
+                if not dry_run and '; '.join(notices) != (notice or ''):
+                    conn.execute('UPDATE information_table SET notice = ? WHERE user_ID = ?', ('; '.join(notices), user_id))
+
+        ids = json.dumps(removed_ids)
+        removed_points = conn.execute('''
+            SELECT (SELECT COUNT(*) FROM efficiency_table WHERE user_id IN (SELECT value FROM json_each(?)))
+                 + (SELECT COALESCE(SUM(point_count), 0) FROM packed_curve WHERE user_id IN (SELECT value FROM json_each(?)))
+        ''', (ids, ids)).fetchone()[0]
+        if not dry_run and removed_ids:
+            report_progress(0.5, f'刪除 {len(removed_ids)} 筆重複記錄')
+            conn.execute('DELETE FROM efficiency_table WHERE user_id IN (SELECT value FROM json_each(?))', (ids,))
+            conn.execute('DELETE FROM packed_curve WHERE user_id IN (SELECT value FROM json_each(?))', (ids,))
+            conn.execute('DELETE FROM information_table WHERE user_ID IN (SELECT value FROM json_each(?))', (ids,))
+            refresh_curve_summaries(conn, removed_ids)
+            bump_data_version(conn)
+        conn.commit()
+
+        return jsonify({
+            'success': True,
+            'dry_run': dry_run,
+            'removed_records': len(removed_ids),
+            'removed_points': removed_points,
+            'groups': groups,
+            'conflicts': conflicts
+        })
+    except Exception as e:
+        get_db().rollback()
+        return jsonify({'error': f'合併重複記錄失敗: {str(e)}'}), 500
+
 @app.route('/api/multi-search')
+@cached_response
 def multi_search():
     series_numbers = request.args.get('series_numbers')
     powerstage_name = request.args.get('powerstage_name')
     phase_count = request.args.get('phase_count')
-    conn = sqlite3.connect('data/vr_efficiency.sqlite')
-    records = []
+    try:
+        curve_format = get_curve_format(request.args)
+        max_points = get_max_points(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    conn = get_db()
     if series_numbers:
         sn_list = [int(s) for s in series_numbers.split(',') if s.strip().isdigit()]
-        for sn in sn_list:
-            info_cursor = conn.execute('SELECT user_ID, pcb_name, powerstage_name, phase_count, frequency, inductor_value, upload_date FROM information_table WHERE series_number = ?', (sn,))
-            info_row = info_cursor.fetchone()
-            if info_row:
-                user_id = info_row[0]
-                eff_cursor = conn.execute('''
-                    SELECT iout, efficiency, efficiency_remote, vin, vout
-                    FROM efficiency_table
-                    WHERE user_id = ?
-                    ORDER BY iout
-                ''', (user_id,))
-                efficiency_data = []
-                for eff_row in eff_cursor.fetchall():
-                    efficiency_data.append({
-                        'iout': eff_row[0],
-                        'efficiency': eff_row[1],
-                        'efficiency_remote': eff_row[2],
-                        'vin': eff_row[3],
-                        'vout': eff_row[4]
-                    })
-                records.append({
-                    'user_id': user_id,
-                    'pcb_name': info_row[1],
-                    'powerstage_name': info_row[2],
-                    'phase_count': info_row[3],
-                    'frequency': info_row[4],
-                    'inductor_value': info_row[5],
-                    'upload_date': info_row[6],
-                    'efficiency_data': efficiency_data
-                })
+        cursor = conn.execute('''
+            SELECT series_number, user_ID, pcb_name, powerstage_name, phase_count, frequency, inductor_value, upload_date
+            FROM information_table
+            WHERE series_number IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(sn_list),))
+        info_by_sn = {row[0]: row[1:] for row in cursor.fetchall()}
+        # 依照使用者勾選的順序回傳
+        info_rows = [info_by_sn[sn] for sn in sn_list if sn in info_by_sn]
     else:
         query = '''
             SELECT i.user_ID, i.pcb_name, i.powerstage_name, i.phase_count, i.frequency,
@@ -587,80 +2758,223 @@ def multi_search():
             query += " AND i.phase_count = ?"
             params.append(int(phase_count))
         cursor = conn.execute(query, params)
-        for row in cursor.fetchall():
-            user_id = row[0]
-            eff_cursor = conn.execute('''
-                SELECT iout, efficiency, efficiency_remote, vin, vout
-                FROM efficiency_table
-                WHERE user_id = ?
-                ORDER BY iout
-            ''', (user_id,))
-            efficiency_data = []
-            for eff_row in eff_cursor.fetchall():
-                efficiency_data.append({
-                    'iout': eff_row[0],
-                    'efficiency': eff_row[1],
-                    'efficiency_remote': eff_row[2],
-                    'vin': eff_row[3],
-                    'vout': eff_row[4]
-                })
-            records.append({
-                'user_id': user_id,
-                'pcb_name': row[1],
-                'powerstage_name': row[2],
-                'phase_count': row[3],
-                'frequency': row[4],
-                'inductor_value': row[5],
-                'upload_date': row[6],
-                'efficiency_data': efficiency_data
-            })
-    conn.close()
+        info_rows = cursor.fetchall()
+
+    curves = fetch_curves(conn, [row[0] for row in info_rows], max_points=max_points)
+    records = []
+    for row in info_rows:
+        records.append({
+            'user_id': row[0],
+            'pcb_name': row[1],
+            'powerstage_name': row[2],
+            'phase_count': row[3],
+            'frequency': row[4],
+            'inductor_value': row[5],
+            'upload_date': row[6],
+            'efficiency_data': format_curve(curves[row[0]], curve_format)
+        })
     return jsonify(records)
 
+# /api/compare 重新取樣的格點數（預設與上限）
+COMPARE_DEFAULT_POINTS = 100
+COMPARE_MAX_POINTS = 500
+COMPARE_FIELDS = ('iout', 'efficiency', 'vin', 'iin', 'vout')
+COMPARE_METRICS = ('efficiency', 'efficiency_delta', 'power_loss', 'power_loss_delta')
+
+# 數值陣列轉為 JSON list，NaN（超出量測範圍）轉為 None
+def to_json_values(values, decimals=4):
+    return np.where(np.isnan(values), None, np.round(values, decimals)).tolist()
+
+@app.route('/api/compare')
+@cached_response
+def compare_curves():
+    # 將勾選的曲線重新取樣到相同的 Iout 格點，計算與基準曲線的差異及功率損耗（Vin·Iin − Vout·Iout）
+    # series_numbers: 逗號分隔；baseline: 基準的 series_number（預設為第一筆）
+    # points: 格點數；iout_min / iout_max: 格點範圍（預設涵蓋所有曲線的量測範圍）
+    # metrics: 逗號分隔，只回傳需要的數列（預設全部，見 COMPARE_METRICS）
+    # 超出個別曲線量測範圍的格點回傳 null，不外插
+    metrics = [m for m in request.args.get('metrics', ','.join(COMPARE_METRICS)).split(',') if m]
+    if not metrics or any(m not in COMPARE_METRICS for m in metrics):
+        return jsonify({'error': f'metrics 必須為 {", ".join(COMPARE_METRICS)} 的組合'}), 400
+    try:
+        series_numbers = list(dict.fromkeys(
+            int(s) for s in request.args.get('series_numbers', '').split(',') if s.strip()))
+        baseline = int(request.args.get('baseline', series_numbers[0] if series_numbers else 0))
+        points = min(max(int(request.args.get('points', COMPARE_DEFAULT_POINTS)), 2), COMPARE_MAX_POINTS)
+        iout_min = float(request.args['iout_min']) if request.args.get('iout_min') else None
+        iout_max = float(request.args['iout_max']) if request.args.get('iout_max') else None
+    except ValueError:
+        return jsonify({'error': '無效的比較參數'}), 400
+    if not series_numbers:
+        return jsonify({'error': '請提供 series_numbers'}), 400
+    if baseline not in series_numbers:
+        return jsonify({'error': 'baseline 必須是 series_numbers 之一'}), 400
+
+    conn = get_db()
+    cursor = conn.execute('''
+        SELECT series_number, user_ID, pcb_name, powerstage_name, phase_count, frequency,
+               inductor_value, imax, upload_date
+        FROM information_table
+        WHERE series_number IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(series_numbers),))
+    info_by_sn = {row[0]: row for row in cursor.fetchall()}
+    info_rows = [info_by_sn[sn] for sn in series_numbers if sn in info_by_sn]
+    curves = fetch_efficiency_curves(conn, [row[1] for row in info_rows], COMPARE_FIELDS)
+
+    # 每條曲線的量測值（依 iout 排序）與功率損耗
+    measured = {}
+    for row in info_rows:
+        curve = {field: np.asarray(values, dtype=float) for field, values in curves[row[1]].items()}
+        if len(curve['iout']):
+            curve['power_loss'] = curve['vin'] * curve['iin'] - curve['vout'] * curve['iout']
+            measured[row[0]] = curve
+    if not measured:
+        return jsonify({'error': '沒有可比較的效率數據'}), 404
+    # 基準記錄不存在或沒有量測點時無法計算差異
+    if baseline not in measured:
+        return jsonify({'error': '基準曲線沒有效率數據'}), 404
+
+    low = iout_min if iout_min is not None else min(curve['iout'][0] for curve in measured.values())
+    high = iout_max if iout_max is not None else max(curve['iout'][-1] for curve in measured.values())
+    if not high > low:
+        return jsonify({'error': 'iout_max 必須大於 iout_min'}), 400
+    grid = np.linspace(low, high, points)
+
+    resampled = {}
+    for sn, curve in measured.items():
+        resampled[sn] = {
+            field: np.interp(grid, curve['iout'], curve[field], left=np.nan, right=np.nan)
+            for field in ('efficiency', 'power_loss')
+        }
+    empty = np.full(points, np.nan)
+    base = resampled[baseline]
+
+    records = []
+    for row in info_rows:
+        values = resampled.get(row[0], {'efficiency': empty, 'power_loss': empty})
+        series = {
+            'efficiency': lambda: values['efficiency'],
+            'efficiency_delta': lambda: values['efficiency'] - base['efficiency'],
+            'power_loss': lambda: values['power_loss'],
+            'power_loss_delta': lambda: values['power_loss'] - base['power_loss']
+        }
+        curve = measured.get(row[0])
+        record = {
+            'series_number': row[0],
+            'user_id': row[1],
+            'pcb_name': row[2],
+            'powerstage_name': row[3],
+            'phase_count': row[4],
+            'frequency': row[5],
+            'inductor_value': row[6],
+            'imax': row[7],
+            'upload_date': row[8],
+            'vin': float(curve['vin'][0]) if curve else None,
+            'vout': float(curve['vout'][0]) if curve else None
+        }
+        for metric in metrics:
+            record[metric] = to_json_values(series[metric]())
+        records.append(record)
+    return jsonify({'iout': to_json_values(grid), 'baseline': baseline, 'records': records})
+
 @app.route('/api/series-numbers', methods=['GET'])
+@cached_response
 def get_series_numbers():
     try:
-        conn = sqlite3.connect('data/vr_efficiency.sqlite')
+        conn = get_db()
         cursor = conn.cursor()
 
         # 只回傳 information_table 中的 series_number
         cursor.execute('SELECT series_number FROM information_table WHERE series_number IS NOT NULL')
         series_numbers = [row[0] for row in cursor.fetchall()]
 
-        conn.close()
         return jsonify(series_numbers)
     except Exception as e:
         return jsonify({'error': f'Failed to fetch series numbers: {str(e)}'}), 500
 
 @app.route('/api/powerstage-options', methods=['GET'])
+@cached_response
 def get_powerstage_options():
     try:
-        conn = sqlite3.connect('data/vr_efficiency.sqlite')
+        conn = get_db()
         cursor = conn.cursor()
 
         # 取得所有不重複的 powerstage_name
         cursor.execute('SELECT DISTINCT powerstage_name FROM information_table WHERE powerstage_name IS NOT NULL ORDER BY powerstage_name')
         powerstage_names = [row[0] for row in cursor.fetchall()]
 
-        conn.close()
         return jsonify(powerstage_names)
     except Exception as e:
         return jsonify({'error': f'Failed to fetch powerstage options: {str(e)}'}), 500
 
+@app.route('/api/typeahead', methods=['GET'])
+@cached_response
+def typeahead():
+    # 例：/api/typeahead?field=powerstage_name&q=sir&limit=10，開頭相符者排在前面
+    field = request.args.get('field', 'powerstage_name')
+    q = request.args.get('q', '').strip()
+    if field not in SEARCH_TEXT_COLUMNS:
+        return jsonify({'error': f'field 必須為 {", ".join(SEARCH_TEXT_COLUMNS)} 之一'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': '無效的 limit'}), 400
+
+    conn = get_db()
+    source = "information_table"
+    if has_search_index(conn) and len(q) >= SEARCH_INDEX_MIN_CHARS:
+        source = "information_fts"
+    cursor = conn.execute(f'''
+        SELECT {field} FROM {source}
+        WHERE {field} LIKE ?
+        GROUP BY {field}
+        ORDER BY {field} LIKE ? DESC, {field}
+        LIMIT ?
+    ''', (f"%{q}%", f"{q}%", limit))
+    return jsonify([row[0] for row in cursor.fetchall()])
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    job = get_job_state(job_id)
+    if job is None:
+        return jsonify({'error': '找不到指定的工作'}), 404
+    if not can_view_job(job):
+        return jsonify({'error': '需要管理者權限'}), 403
+    return jsonify(job)
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus 文字格式；各 worker 分別統計
+    return app.response_class(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 # WebSocket 事件處理
 @socketio.on('connect')
 def handle_connect():
+    global socketio_client_count
+    with metrics_lock:
+        socketio_client_count += 1
     print(f'客戶端已連接: {request.sid}')
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    global socketio_client_count
+    with metrics_lock:
+        socketio_client_count -= 1
     print(f'客戶端已斷線: {request.sid}')
 
 @socketio.on('join_room')
 def handle_join_room(data):
     room = data.get('room', 'general')
+    job = get_job_state(room[len('job_'):]) if room.startswith('job_') else None
+    # 管理者工作的房間只允許連線時已登入管理者的客戶端加入（之後才登入的由 /api/jobs/<id> 輪詢）
+    if job and not can_view_job(job):
+        emit('error', {'room': room, 'error': '需要管理者權限'})
+        return
     join_room(room)
     emit('joined_room', {'room': room})
+    # 加入工作的房間時先送出目前的狀態：工作可能在加入之前就已完成，或由其他 worker 執行
+    if job:
+        emit('job_completed' if job['status'] in ('completed', 'failed') else 'job_progress', job)
 
 @app.route('/admin/update-information/<int:user_id>', methods=['POST'])
 @admin_required
@@ -685,17 +2999,20 @@ def update_information(user_id):
     values.append(user_id)
 
     try:
-        conn = sqlite3.connect('data/vr_efficiency.sqlite')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute(f'''
             UPDATE information_table
             SET {set_clause}
             WHERE user_ID = ?
         ''', values)
-        conn.commit()
-        conn.close()
         if cursor.rowcount == 0:
             return jsonify({'error': '找不到指定 user_ID'}), 404
+        # imax 影響負載點的位置
+        if 'imax' in update_fields:
+            refresh_curve_summaries(conn, [user_id])
+        bump_data_version(conn)
+        conn.commit()
         return jsonify({'success': True, 'message': '資料已更新'})
     except Exception as e:
         return jsonify({'error': f'更新失敗: {str(e)}'}), 500
@@ -705,10 +3022,39 @@ def update_information(user_id):
 def admin_page():
     return render_template('admin.html')
 
+# 建立資料目錄、資料表、索引與摘要（可重複執行）；gunicorn 在 master 啟動 worker 之前執行一次
+@app.cli.command('init-db')
+def init_db_command():
+    os.makedirs(get_data_dir(), exist_ok=True)
+    started = time.perf_counter()
+    init_db()
+    click.echo(f'資料庫已初始化：{app.config["DB_PATH"]}（{time.perf_counter() - started:.2f} 秒）')
+
+# 轉換既有記錄的曲線保存方式：flask --app app migrate-curves packed（或 rows）
+# 建議在停止服務後執行；--vacuum 於轉換後整理資料庫檔案、釋放空間
+@app.cli.command('migrate-curves')
+@click.argument('target', type=click.Choice(CURVE_STORAGES))
+@click.option('--vacuum', is_flag=True, help='轉換後執行 VACUUM')
+def migrate_curves_command(target, vacuum):
+    init_db()
+    conn = connect_db()
+    try:
+        started = time.perf_counter()
+        migrated = migrate_curve_storage(conn, target, lambda done, total: click.echo(f'{done}/{total}'))
+        bump_data_version(conn)
+        conn.commit()
+        click.echo(f'轉換 {migrated} 筆記錄為 {target}，耗時 {time.perf_counter() - started:.1f} 秒')
+        if vacuum:
+            conn.execute('VACUUM')
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        conn.close()
+
 if __name__ == '__main__':
     # 確保目錄存在
-    if not os.path.exists('data'):
-        os.makedirs('data')
+    if not os.path.exists(get_data_dir()):
+        os.makedirs(get_data_dir())
     if not os.path.exists('templates'):
         os.makedirs('templates')
     
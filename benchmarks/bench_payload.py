@@ -0,0 +1,72 @@
+# bench_payload.py - 比較曲線回傳格式（points / columnar / f32）及 max_points 降採樣的大小與延遲
+#
+# 用法: python benchmarks/bench_payload.py [--records 2000 --points 200 --max-points 100]
+# 會分別測試 data/vr_efficiency.sqlite 的實際資料與合成資料
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+from synthetic import ROOT, build_database
+
+import app
+
+REPEAT = 5
+
+
+def measure(client, url, warm_curves=False):
+    timings = []
+    for _ in range(REPEAT):
+        # 清除快取，量測實際的查詢與序列化時間；warm_curves 時保留降採樣後的曲線快取
+        app.query_cache.clear()
+        if not warm_curves:
+            app.curve_cache.clear()
+        start = time.perf_counter()
+        plain = client.get(url)
+        timings.append((time.perf_counter() - start) * 1000)
+    app.query_cache.clear()
+    compressed = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert plain.status_code == 200 and compressed.headers.get('Content-Encoding') == 'gzip'
+    return len(plain.data), len(compressed.data), statistics.median(timings)
+
+
+def report(label, client, max_points):
+    series_numbers = ','.join(str(sn) for sn in client.get('/api/series-numbers').get_json())
+    print(f"\n== {label}")
+    print(f"{'endpoint':<14} {'format':<9} {'bytes':>12} {'gzip bytes':>11} {'median ms':>10}")
+    for endpoint, url in (('search', '/api/search'), ('multi-search', f'/api/multi-search?series_numbers={series_numbers}')):
+        for curve_format in app.CURVE_FORMATS:
+            separator = '&' if '?' in url else '?'
+            raw, gz, ms = measure(client, f'{url}{separator}format={curve_format}')
+            print(f"{endpoint:<14} {curve_format:<9} {raw:>12,} {gz:>11,} {ms:>10.1f}")
+        separator = '&' if '?' in url else '?'
+        for state, warm in (('cold', False), ('cached', True)):
+            raw, gz, ms = measure(client, f'{url}{separator}format=columnar&max_points={max_points}', warm)
+            print(f"{endpoint:<14} {f'max {state}':<10} {raw:>12,} {gz:>11,} {ms:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--points', type=int, default=200)
+    parser.add_argument('--max-points', type=int, default=100)
+    args = parser.parse_args()
+
+    client = app.app.test_client()
+    with tempfile.TemporaryDirectory() as root:
+        db_path = os.path.join(root, 'vr_efficiency.sqlite')
+        shutil.copy(os.path.join(ROOT, 'data', 'vr_efficiency.sqlite'), db_path)
+        app.app.config['DB_PATH'] = db_path
+        app.init_db()
+        report('data/vr_efficiency.sqlite', client, args.max_points)
+
+    with tempfile.TemporaryDirectory() as root:
+        build_database(root, args.records, args.points)
+        report(f'synthetic {args.records} records x {args.points} points', client, args.max_points)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+# bench_schema.py - 刪除 efficiency_table 欄位：原生 DROP COLUMN、分批重建與舊版 CREATE TABLE AS SELECT 的比較
+#
+# 每種方式量測總耗時，以及同時執行的寫入連線最長等待多久（寫入鎖被持有的時間）
+# 用法: python benchmarks/bench_schema.py [--records 20000 --points 100]（預設 200 萬列）
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+
+from synthetic import build_database
+
+import app
+
+
+def legacy_remove(conn, table_name, column_name):
+    # 原本的做法：CREATE TABLE AS SELECT 後改名，主鍵、AUTOINCREMENT 與索引都會遺失
+    columns = ', '.join(c for c in app.get_table_columns(table_name) if c != column_name)
+    conn.execute(f'CREATE TABLE {table_name}_temp AS SELECT {columns} FROM {table_name}')
+    conn.execute(f'DROP TABLE {table_name}')
+    conn.execute(f'ALTER TABLE {table_name}_temp RENAME TO {table_name}')
+    conn.commit()
+
+
+def native_remove(conn, table_name, column_name):
+    conn.execute(f'ALTER TABLE {table_name} DROP COLUMN {column_name}')
+    conn.commit()
+
+
+def rebuild_remove(conn, table_name, column_name):
+    app.rebuild_without_column(conn, table_name, column_name)
+    conn.commit()
+
+
+METHODS = [('drop column', native_remove), ('chunked rebuild', rebuild_remove), ('legacy CTAS', legacy_remove)]
+
+
+class Writer(threading.Thread):
+    # 持續新增量測點，記錄每次寫入的耗時
+    def __init__(self, db_path):
+        super().__init__()
+        self.db_path = db_path
+        self.stop = False
+        self.latencies = []
+        self.ready = threading.Event()
+
+    def run(self):
+        try:
+            self.write()
+        finally:
+            self.ready.set()
+
+    def write(self):
+        conn = sqlite3.connect(self.db_path, timeout=600)
+        while not self.stop:
+            start = time.perf_counter()
+            conn.execute('INSERT INTO information_table (user_name, pcb_name, powerstage_name, phase_count,'
+                         " frequency, inductor_value, tlvr, imax) VALUES ('bench', 'P', 'X', 1, 1, 1, 'no', 1)")
+            conn.commit()
+            self.latencies.append(time.perf_counter() - start)
+            self.ready.set()
+            time.sleep(0.005)
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--points', type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f'building {args.records} records x {args.points} points ...')
+        source = build_database(root, args.records, args.points)
+        conn = sqlite3.connect(source)
+        conn.execute('ALTER TABLE efficiency_table ADD COLUMN bench_note TEXT')
+        conn.execute("UPDATE efficiency_table SET bench_note = 'x'")
+        conn.commit()
+        conn.close()
+        print(f'SQLite {sqlite3.sqlite_version}, chunk {app.SCHEMA_CHUNK_ROWS} rows\n')
+
+        print(f"{'method':<16} {'total s':>8} {'writes':>7} {'max write wait ms':>18} {'indexes kept':>13}")
+        for label, remove in METHODS:
+            db_path = f'{root}/{label.replace(" ", "_")}.sqlite'
+            shutil.copy(source, db_path)
+            app.app.config['DB_PATH'] = db_path
+            with app.app.app_context():
+                conn = app.get_db()
+                writer = Writer(db_path)
+                writer.start()
+                writer.ready.wait()
+                start = time.perf_counter()
+                remove(conn, 'efficiency_table', 'bench_note')
+                elapsed = time.perf_counter() - start
+                writer.stop = True
+                writer.join()
+                indexes = sorted(row[0] for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'efficiency_table'"))
+            # 第一筆是開始前的暖身寫入
+            print(f"{label:<16} {elapsed:>8.2f} {len(writer.latencies) - 1:>7} "
+                  f"{max(writer.latencies) * 1000:>18.1f} {len(indexes):>13}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
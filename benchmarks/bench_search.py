@@ -0,0 +1,97 @@
+# bench_search.py - 比較 /api/search 舊版逐筆查詢 (N+1) 與批次查詢的查詢次數與延遲
+#
+# 用法: python benchmarks/bench_search.py --sizes 1000 10000 100000 --points 10
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+from synthetic import build_database
+
+QUERY_COUNT = [0]
+_connect = sqlite3.connect
+
+
+# 計算每次請求實際送出的 SQL 數量（不含連線時設定的 PRAGMA）
+def count_query(sql):
+    if not sql.startswith('PRAGMA'):
+        QUERY_COUNT[0] += 1
+
+
+def counting_connect(*args, **kwargs):
+    conn = _connect(*args, **kwargs)
+    conn.set_trace_callback(count_query)
+    return conn
+
+
+# 舊版 search_records 的逐筆查詢邏輯，作為比較基準
+def legacy_search(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    records = []
+    for row in conn.execute('SELECT * FROM information_table WHERE 1=1 ORDER BY upload_date DESC').fetchall():
+        record = dict(row)
+        eff_cursor = conn.execute('''
+            SELECT iout, efficiency, efficiency_remote, vin, vout
+            FROM efficiency_table
+            WHERE user_id = ?
+            ORDER BY iout
+        ''', (row['user_ID'],))
+        record['efficiency_data'] = [
+            {'iout': r[0], 'efficiency': r[1], 'efficiency_remote': r[2], 'vin': r[3], 'vout': r[4]}
+            for r in eff_cursor.fetchall()
+        ]
+        records.append(record)
+    conn.close()
+    return records
+
+
+# 新版 search_records 的資料庫部分（主查詢 + 一次批次取曲線）
+def batched_search(db_path):
+    import app
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    records = [dict(row) for row in conn.execute('SELECT * FROM information_table WHERE 1=1 ORDER BY upload_date DESC')]
+    curves = app.fetch_efficiency_curves(conn, [record['user_ID'] for record in records])
+    for record in records:
+        record['efficiency_data'] = curves[record['user_ID']]
+    conn.close()
+    return records
+
+
+def measure(fn):
+    QUERY_COUNT[0] = 0
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, QUERY_COUNT[0], result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--points', type=int, default=10)
+    args = parser.parse_args()
+
+    sqlite3.connect = counting_connect
+    import app
+    client = app.app.test_client()
+
+    # db ms 只計資料庫查詢與組裝；http ms 為含 JSON 序列化的完整請求
+    print(f"{'records':>8} {'points':>7} {'legacy q':>9} {'legacy db ms':>13} {'legacy http ms':>15} "
+          f"{'batched q':>10} {'batched db ms':>14} {'batched http ms':>16}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as root:
+            db_path = build_database(root, size, args.points)
+            # 舊版同樣經過 Flask 的 JSON 序列化，兩者比較的是相同的工作量
+            legacy_db_ms, legacy_q, _ = measure(lambda: legacy_search(db_path))
+            legacy_ms, _, _ = measure(lambda: app.app.json.dumps(legacy_search(db_path)))
+            new_db_ms, _, _ = measure(lambda: batched_search(db_path))
+            new_ms, new_q, response = measure(lambda: client.get('/api/search'))
+            assert response.status_code == 200
+            print(f"{size:>8} {args.points:>7} {legacy_q:>9} {legacy_db_ms:>13.1f} {legacy_ms:>15.1f} "
+                  f"{new_q:>10} {new_db_ms:>14.1f} {new_ms:>16.1f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
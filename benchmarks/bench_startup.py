@@ -0,0 +1,142 @@
+# bench_startup.py - 啟動時間與每個 worker 的記憶體（RSS）
+#
+# 1. 在新的 Python 行程中 import app 的時間與 RSS，並與啟動時就載入 pandas 的情況比較
+# 2. 以 gunicorn.conf.py 啟動 1、2、4 個 worker，量測到 /healthz 回應為止的時間與各行程的 RSS，
+#    之後連續上傳兩筆資料，比較第一次與第二次上傳的延遲（pandas 在各 worker 第一次上傳時才載入，
+#    多個 worker 時第二次上傳可能由另一個 worker 處理，同樣需要載入）
+# 用法: python benchmarks/bench_startup.py [--workers 1 2 4 --repeat 5]
+import os
+import sys
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import statistics
+import subprocess
+import http.client
+
+from synthetic import ROOT, build_database, synthetic_curve
+
+PORT = 5098
+IMPORT_SCRIPT = '''
+import time
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+rss = [line for line in open('/proc/self/status') if line.startswith('VmRSS')][0].split()[1]
+print(elapsed, rss)
+'''
+
+
+def rss_mib(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        children.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return children
+
+
+def measure_import(imports, repeat):
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT.format(imports=imports)], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.split()
+        samples.append((float(output[0]), int(output[1]) / 1024))
+    return statistics.median(s[0] for s in samples) * 1000, statistics.median(s[1] for s in samples)
+
+
+def request(method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=60)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def upload(rng):
+    boundary = uuid.uuid4().hex
+    fields = {'user_name': 'bench', 'pcb_name': 'DB391', 'powerstage_name': 'TDA22594A', 'phase_count': '6',
+              'frequency': '800', 'inductor_value': '100', 'tlvr': 'no', 'imax': '300'}
+    rows = ['Istep,Vin,Iin,Vout,remote Vout sense,Iout,Efficiency,Efficiency_remote']
+    rows += [','.join(map(str, row)) for row in synthetic_curve(rng, 300, 200)]
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+             for name, value in fields.items()]
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="bench.csv"\r\n'
+                 f'Content-Type: text/csv\r\n\r\n{chr(10).join(rows)}\r\n'.encode())
+    parts.append(f'--{boundary}--\r\n'.encode())
+    start = time.perf_counter()
+    status, body = request('POST', '/upload', b''.join(parts), {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    assert status == 200, body
+    return (time.perf_counter() - start) * 1000
+
+
+def measure_gunicorn(root, db_path, workers):
+    env = dict(os.environ, PORT=str(PORT), VR_DB_PATH=db_path, VR_WORKERS=str(workers),
+               VR_SOCKETIO_MESSAGE_QUEUE=f'sqlite:///{root}/socketio_queue.sqlite')
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                if request('GET', '/healthz')[0] == 200:
+                    break
+            except OSError:
+                pass
+            if time.perf_counter() - start > 60:
+                raise RuntimeError('gunicorn 未能啟動')
+            time.sleep(0.05)
+        ready_s = time.perf_counter() - start
+        # 等所有 worker 都載入 app
+        time.sleep(2)
+        worker_rss = [rss_mib(pid) for pid in child_pids(process.pid)]
+        rng = random.Random()
+        first_upload, second_upload = upload(rng), upload(rng)
+        return ready_s, rss_mib(process.pid), worker_rss, first_upload, second_upload
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--points', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'import':<24} {'ms':>8} {'RSS MiB':>8}")
+    for label, imports in (('app', 'import app'), ('app + pandas (eager)', 'import pandas\nimport app')):
+        elapsed, rss = measure_import(imports, args.repeat)
+        print(f'{label:<24} {elapsed:>8.0f} {rss:>8.1f}')
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f'\nbuilding {args.records} records x {args.points} points ...')
+        db_path = build_database(root, args.records, args.points)
+        print(f"{'workers':>7} {'ready s':>8} {'master MiB':>11} {'worker MiB':>11} {'total MiB':>10} "
+              f"{'1st upload ms':>14} {'2nd upload ms':>14}")
+        for workers in args.workers:
+            ready_s, master_rss, worker_rss, first_upload, second_upload = measure_gunicorn(root, db_path, workers)
+            print(f'{workers:>7} {ready_s:>8.2f} {master_rss:>11.1f} {statistics.mean(worker_rss):>11.1f} '
+                  f'{master_rss + sum(worker_rss):>10.1f} {first_upload:>14.1f} {second_upload:>14.1f}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
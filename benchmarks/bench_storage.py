@@ -0,0 +1,100 @@
+# bench_storage.py - 曲線保存方式：efficiency_table 每點一列（rows）與每筆記錄一個欄式 BLOB（packed）的比較
+#
+# 同一份合成資料庫複製一份轉成 packed，兩者都 VACUUM 後比較檔案大小、讀取曲線與主要 API 的延遲（中位數）
+# 用法: python benchmarks/bench_storage.py [--records 5000 --points 200 --repeat 50]
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import statistics
+
+from synthetic import VIN_CHOICES, VOUT_CHOICES, build_database
+
+import app
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def request(client, path):
+    def send():
+        app.query_cache.clear()
+        app.curve_cache.clear()
+        response = client.get(path())
+        assert response.status_code == 200, response.status_code
+        response.get_data()
+    return send
+
+
+def measure(db_path, user_ids, series_numbers, args):
+    app.app.config['DB_PATH'] = db_path
+    rng = random.Random(args.seed)
+    conn = app.connect_db()
+    client = app.app.test_client()
+    results = {'file MiB': os.path.getsize(db_path) / 1024 / 1024}
+    results['read 1 curve ms'] = timed(lambda: app.fetch_efficiency_curves(conn, [rng.choice(user_ids)]), args.repeat)
+    results['read 12 curves ms'] = timed(lambda: app.fetch_efficiency_curves(conn, rng.sample(user_ids, 12)), args.repeat)
+    results['read all fields ms'] = timed(
+        lambda: app.fetch_efficiency_curves(conn, [rng.choice(user_ids)], app.EFFICIENCY_DATA_FIELDS), args.repeat)
+    results['efficiency-data ms'] = timed(request(client, lambda: f'/api/efficiency-data/{rng.choice(user_ids)}'), args.repeat)
+    results['download csv ms'] = timed(request(client, lambda: f'/download/csv/{rng.choice(series_numbers)}'), args.repeat)
+    results['search ms'] = timed(request(client, lambda: '/api/search?limit=12'), args.repeat)
+
+    def vin_vout():
+        vin, vout = rng.choice(VIN_CHOICES), rng.choice(VOUT_CHOICES)
+        return f'/api/search?limit=12&vin_min={vin * 0.99:.3f}&vin_max={vin * 1.01:.3f}&vout_min={vout - 0.01}&vout_max={vout + 0.01}'
+    results['search vin/vout ms'] = timed(request(client, vin_vout), args.repeat)
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--points', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f'building {args.records} records x {args.points} points ...')
+        rows_path = build_database(root, args.records, args.points, args.seed)
+        packed_path = os.path.join(root, 'data', 'packed.sqlite')
+        shutil.copy(rows_path, packed_path)
+
+        conn = sqlite3.connect(packed_path)
+        conn.create_function('packed_curve_in_range', 6, app.packed_curve_in_range, deterministic=True)
+        start = time.perf_counter()
+        app.migrate_curve_storage(conn, 'packed')
+        print(f'migrated to packed in {time.perf_counter() - start:.1f} s\n')
+        conn.close()
+        for path in (rows_path, packed_path):
+            conn = sqlite3.connect(path)
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            conn.execute('VACUUM')
+            conn.close()
+
+        conn = sqlite3.connect(rows_path)
+        user_ids = [row[0] for row in conn.execute('SELECT user_ID FROM information_table')]
+        series_numbers = [row[0] for row in conn.execute('SELECT series_number FROM information_table')]
+        conn.close()
+
+        rows = measure(rows_path, user_ids, series_numbers, args)
+        packed = measure(packed_path, user_ids, series_numbers, args)
+        print(f"{'':<20} {'rows':>9} {'packed':>9} {'packed/rows':>12}")
+        for name in rows:
+            print(f'{name:<20} {rows[name]:>9.2f} {packed[name]:>9.2f} {packed[name] / rows[name]:>11.2f}x')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
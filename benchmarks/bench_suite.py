@@ -0,0 +1,247 @@
+# bench_suite.py - 以合成資料庫對主要 API 進行效能測試，輸出延遲百分位數、吞吐量與記憶體峰值，並可存成基準比較
+#
+# 透過 Flask test client 依序執行各情境（上傳、搜尋、多筆搜尋、單筆曲線、CSV 下載、資料集匯出、備份），每個請求前清除查詢快取
+# 記憶體峰值另外單獨量測以免影響延遲：peak KiB 為單一請求期間 Python 配置的最大量（tracemalloc，看不到 SQLite 排序等原生配置），
+# peak RSS KiB 為同一請求期間行程 RSS 峰值比請求前增加的量（Linux 以 /proc/self/clear_refs 重設峰值，含 mmap 讀入的資料庫頁）
+# 用法: python benchmarks/bench_suite.py [--records 1000 --points 100 --repeat 20]
+#       python benchmarks/bench_suite.py --save baseline.json
+#       python benchmarks/bench_suite.py --compare baseline.json [--threshold 1.25]（有退步時結束碼為 1）
+import io
+import csv
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+from synthetic import ROOT, POWERSTAGES, VIN_CHOICES, VOUT_CHOICES, build_database, synthetic_curve
+
+import app
+
+FORM = {
+    'user_name': 'bench', 'pcb_name': 'DB391', 'powerstage_name': 'TDA22594A', 'phase_count': '6',
+    'frequency': '800', 'inductor_value': '100', 'tlvr': 'no', 'imax': '300'
+}
+# 備份與資料集匯出會讀取整個資料庫，次數另外限制
+HEAVY_SCENARIOS = ('backup', 'dataset')
+HEAVY_MAX_REPEAT = 5
+
+
+def upload_csv(rng, points):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(app.MEASUREMENT_COLUMNS)
+    writer.writerows(synthetic_curve(rng, 300, points))
+    return output.getvalue().encode('utf-8')
+
+
+# 各情境：(名稱, 產生請求參數的函式)，參數為 test client 的 open() 引數
+def scenarios(rng, series_numbers, user_ids, points):
+    def search():
+        return {'path': f'/api/search?limit=12&powerstage_name={rng.choice(POWERSTAGES)}'}
+
+    def search_vin_vout():
+        vin, vout = rng.choice(VIN_CHOICES), rng.choice(VOUT_CHOICES)
+        return {'path': f'/api/search?limit=12&vin_min={vin * 0.9:.2f}&vin_max={vin * 1.1:.2f}'
+                        f'&vout_min={vout * 0.9:.2f}&vout_max={vout * 1.1:.2f}'}
+
+    def search_meta():
+        return {'path': f'/api/search?fields=meta&limit=12&powerstage_name={rng.choice(POWERSTAGES)}'}
+
+    def multi_search():
+        chosen = rng.sample(series_numbers, min(5, len(series_numbers)))
+        return {'path': f'/api/multi-search?series_numbers={",".join(map(str, chosen))}'}
+
+    def efficiency_data():
+        return {'path': f'/api/efficiency-data/{rng.choice(user_ids)}'}
+
+    def download_csv():
+        return {'path': f'/download/csv/{rng.choice(series_numbers)}'}
+
+    def upload():
+        return {'path': '/upload', 'method': 'POST',
+                'data': {**FORM, 'file': (io.BytesIO(upload_csv(rng, points)), 'bench.csv')}}
+
+    def dataset():
+        return {'path': '/download/dataset?format=arrow'}
+
+    def backup():
+        return {'path': '/admin/backup?keep=0'}
+
+    return [('search', search), ('search vin/vout', search_vin_vout), ('search meta', search_meta),
+            ('multi-search', multi_search), ('efficiency-data', efficiency_data), ('download csv', download_csv),
+            ('upload', upload), ('dataset', dataset), ('backup', backup)]
+
+
+def send(client, request):
+    app.query_cache.clear()
+    app.curve_cache.clear()
+    # 逐段讀取回應，不把整個回應存下（避免備份等大型下載的記憶體峰值被測試端放大）
+    response = client.open(**request, buffered=False)
+    assert response.status_code == 200, (request['path'], response.status_code, response.get_data()[:200])
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    return size
+
+
+def read_status_kib(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return None
+
+
+# 單一請求期間 RSS 峰值的增加量（KiB）；無法重設峰值時改用 ru_maxrss，只有超過行程先前的峰值才看得到
+def peak_rss_kib(client, request):
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        before = read_status_kib('VmRSS')
+        send(client, request)
+        return read_status_kib('VmHWM') - before
+    except OSError:
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        send(client, request)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+
+
+def run_scenario(client, make_request, repeat):
+    latencies = []
+    sizes = []
+    for _ in range(repeat):
+        request = make_request()
+        start = time.perf_counter()
+        sizes.append(send(client, request))
+        latencies.append((time.perf_counter() - start) * 1000)
+    # 記憶體峰值另外以請求量測：tracemalloc 本身會配置記憶體，RSS 以另一個請求量測
+    request = make_request()
+    tracemalloc.start()
+    send(client, request)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rss_peak = peak_rss_kib(client, make_request())
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'requests': repeat,
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'req_per_s': round(repeat / (sum(latencies) / 1000), 2),
+        'peak_kib': round(peak / 1024, 1),
+        'peak_rss_kib': rss_peak,
+        'bytes': int(np.median(sizes)),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"{'scenario':<16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'peak KiB':>10} "
+          f"{'peak RSS KiB':>13} {'bytes':>11}")
+    for name, result in results.items():
+        print(f"{name:<16} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+              f"{result['req_per_s']:>8.1f} {result['peak_kib']:>10.1f} {result['peak_rss_kib']:>13,} {result['bytes']:>11,}")
+
+
+# 與基準比較，回傳 p50 超過基準 threshold 倍的情境（p95 樣本少、波動大，只列出供參考）
+def compare(report, baseline, threshold):
+    if (baseline['meta']['records'], baseline['meta']['points']) != (report['meta']['records'], report['meta']['points']):
+        print(f"warning: baseline uses {baseline['meta']['records']} records x {baseline['meta']['points']} points")
+    print(f"\ncompared with {baseline['meta'].get('revision')} ({baseline['meta']['created']})")
+    print(f"{'scenario':<16} {'p50':>18} {'p95':>18} {'peak KiB':>20} {'peak RSS KiB':>22}")
+    regressions = []
+    for name, result in report['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            print(f'{name:<16} (not in baseline)')
+            continue
+        # 舊的基準沒有 peak_rss_kib
+        keys = [key for key in ('p50_ms', 'p95_ms', 'peak_kib', 'peak_rss_kib') if key in base]
+        ratios = {key: result[key] / base[key] if base[key] else 1.0 for key in keys}
+        regressed = ratios['p50_ms'] > threshold
+        if regressed:
+            regressions.append(name)
+        cells = [f"{base[key]:.1f}->{result[key]:.1f} x{ratios[key]:.2f}" if key in base else '-'
+                 for key in ('p50_ms', 'p95_ms', 'peak_kib', 'peak_rss_kib')]
+        print(f"{name:<16} {cells[0]:>18} {cells[1]:>18} {cells[2]:>20} {cells[3]:>22}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=1000)
+    parser.add_argument('--points', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', help='只執行指定的情境')
+    parser.add_argument('--save', help='將結果存成基準 JSON')
+    parser.add_argument('--compare', help='與先前存下的基準 JSON 比較')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f'building {args.records} records x {args.points} points ...')
+        start = time.perf_counter()
+        db_path = build_database(root, args.records, args.points, args.seed)
+        print(f'built in {time.perf_counter() - start:.1f} s\n')
+        conn = sqlite3.connect(db_path)
+        series_numbers = [row[0] for row in conn.execute('SELECT series_number FROM information_table')]
+        user_ids = [row[0] for row in conn.execute('SELECT user_ID FROM information_table')]
+        conn.close()
+
+        client = app.app.test_client()
+        assert client.post('/admin/login', json={'password': app.ADMIN_PASSWORD}).status_code == 200
+        rng = random.Random(args.seed)
+        results = {}
+        for name, make_request in scenarios(rng, series_numbers, user_ids, args.points):
+            if args.only and name not in args.only:
+                continue
+            repeat = min(args.repeat, HEAVY_MAX_REPEAT) if name in HEAVY_SCENARIOS else args.repeat
+            results[name] = run_scenario(client, make_request, repeat)
+
+    report = {
+        'meta': {
+            'records': args.records,
+            'points': args.points,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'revision': git_revision(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'scenarios': results,
+    }
+    print_results(results)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nsaved baseline to {args.save}')
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\nregressions over x{args.threshold}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
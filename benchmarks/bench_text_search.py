@@ -0,0 +1,72 @@
+# bench_text_search.py - powerstage_name / pcb_name 部分比對：LIKE 全表掃描與 FTS5 trigram 索引的比較
+#
+# 用法: python benchmarks/bench_text_search.py [--records 100000]
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import statistics
+
+from synthetic import build_database
+
+import app
+
+# (欄位, 關鍵字)：從涵蓋半數記錄的共同字首到只對應少數記錄的完整料號
+TERMS = [('powerstage_name', 'TDA2'), ('powerstage_name', '594A-R1'), ('powerstage_name', 'r123'),
+         ('powerstage_name', 'sir58'), ('pcb_name', 'evb-vr14-r7')]
+# 合成資料只有少數料號，加上版本後綴模擬實際資料中大量不同的名稱
+NAME_VARIANTS = 400
+
+
+def search_query(column, term, use_index):
+    where, params = app.build_search_filters({column: term}, use_index)
+    return f"SELECT i.user_ID FROM information_table i {where}", params
+
+
+TYPEAHEAD_QUERY = '''
+    SELECT {column} FROM {source} WHERE {column} LIKE ?
+    GROUP BY {column} ORDER BY {column} LIKE ? DESC, {column} LIMIT 10
+'''
+
+
+def timed(conn, sql, params, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--points', type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f'building {args.records} records ...')
+        conn = sqlite3.connect(build_database(root, args.records, args.points))
+        assert app.has_search_index(conn), '此 SQLite 版本不支援 FTS5 trigram'
+        # 透過 UPDATE 觸發器同步全文索引
+        conn.execute(f"UPDATE information_table SET powerstage_name = powerstage_name || '-R' || (user_ID % {NAME_VARIANTS}),"
+                     f" pcb_name = pcb_name || '-R' || (user_ID % {NAME_VARIANTS // 20})")
+        conn.commit()
+
+        print(f"{'term':<24} {'rows':>7} {'LIKE ms':>9} {'FTS ms':>9} {'typeahead LIKE':>15} {'typeahead FTS':>14}")
+        for column, term in TERMS:
+            like_ms, like_rows = timed(conn, *search_query(column, term, False))
+            fts_ms, fts_rows = timed(conn, *search_query(column, term, True))
+            assert sorted(like_rows) == sorted(fts_rows)
+            params = (f'%{term}%', f'{term}%')
+            typeahead_like_ms, like_names = timed(conn, TYPEAHEAD_QUERY.format(column=column, source='information_table'), params)
+            typeahead_fts_ms, fts_names = timed(conn, TYPEAHEAD_QUERY.format(column=column, source='information_fts'), params)
+            assert like_names == fts_names
+            label = f'{column}={term}'
+            print(f"{label:<24} {len(like_rows):>7} {like_ms:>9.2f} {fts_ms:>9.2f} {typeahead_like_ms:>15.2f} {typeahead_fts_ms:>14.2f}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# bench_upload.py - 比較舊版 iterrows 逐列 INSERT 與向量化批次寫入的上傳速度
+#
+# 用法: python benchmarks/bench_upload.py --rows 1000 10000 50000
+import io
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+import pandas as pd
+
+from synthetic import build_database, synthetic_curve
+
+import app
+
+FORM = {
+    'user_name': 'bench', 'pcb_name': 'DB391', 'powerstage_name': 'TDA22594A', 'phase_count': '6',
+    'frequency': '800', 'inductor_value': '100', 'tlvr': 'no', 'imax': '300'
+}
+
+
+def sweep_frame(rows, seed=0):
+    rng = random.Random(seed)
+    return pd.DataFrame(synthetic_curve(rng, 300, rows), columns=list(app.MEASUREMENT_COLUMNS))
+
+
+# 舊版 upload_file 的逐列寫入邏輯，作為比較基準
+def legacy_insert(conn, df):
+    cursor = conn.cursor()
+    for _, row in df.iterrows():
+        cursor.execute('''
+            INSERT INTO efficiency_table
+            (istep, vin, iin, vout, remote_vout_sense, iout, efficiency, efficiency_remote, user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (row['Istep'], row['Vin'], row['Iin'], row['Vout'],
+              row['remote Vout sense'], row['Iout'], row['Efficiency'],
+              row['Efficiency_remote'], 0))
+    conn.commit()
+
+
+def bulk_insert(conn, df):
+    app.insert_measurements(conn.cursor(), 0, app.prepare_measurement_frame(df))
+    conn.commit()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    client = app.app.test_client()
+    print(f"{'rows':>7} {'legacy rows/s':>14} {'bulk rows/s':>12} {'speedup':>8} {'/upload ms':>11}")
+    for rows in args.rows:
+        df = sweep_frame(rows)
+        with tempfile.TemporaryDirectory() as root:
+            db_path = build_database(root, 0, 0)
+            conn = sqlite3.connect(db_path)
+            legacy_s = timed(lambda: legacy_insert(conn, df))
+            bulk_s = timed(lambda: bulk_insert(conn, df))
+            conn.close()
+
+            # 完整的 /upload 請求（含 CSV 解析）
+            payload = df.to_csv(index=False).encode('utf-8')
+            upload_s = timed(lambda: client.post('/upload', data={**FORM, 'file': (io.BytesIO(payload), 'sweep.csv')}))
+        print(f"{rows:>7} {rows / legacy_s:>14.0f} {rows / bulk_s:>12.0f} {legacy_s / bulk_s:>7.1f}x {upload_s * 1000:>11.1f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
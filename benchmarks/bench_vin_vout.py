@@ -0,0 +1,86 @@
+# bench_vin_vout.py - vin/vout 範圍搜尋：舊版 JOIN + DISTINCT 與 EXISTS 半連接 + 覆蓋索引的比較
+#
+# 用法: python benchmarks/bench_vin_vout.py [--records 10000 --points 100]（預設約 100 萬個量測點）
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+from synthetic import build_database
+
+import app
+
+# (vin_min, vin_max, vout_min, vout_max)：12V -> 0.8V、48V -> 1.0V、5V 全部輸出
+RANGES = [(10.8, 13.2, 0.72, 0.88), (43.2, 52.8, 0.9, 1.1), (4.5, 5.5, 0.0, 2.0)]
+
+LEGACY_QUERY = '''
+    SELECT DISTINCT i.* FROM information_table i
+    JOIN efficiency_table e ON i.user_ID = e.user_id
+    WHERE 1=1 AND e.vin BETWEEN ? AND ? AND e.vout BETWEEN ? AND ?
+    ORDER BY i.upload_date DESC
+'''
+
+
+def current_query(vin_min, vin_max, vout_min, vout_max):
+    # 與 request.args 相同，以字串傳入
+    args = {'vin_min': str(vin_min), 'vin_max': str(vin_max), 'vout_min': str(vout_min), 'vout_max': str(vout_max)}
+    where, params = app.build_search_filters(args)
+    return f"SELECT i.* FROM information_table i {where} ORDER BY COALESCE(i.upload_date, '') DESC, i.user_ID DESC", params
+
+
+def timed(conn, sql, params, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), len(rows)
+
+
+def query_plan(conn, sql, params):
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--points', type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f'building {args.records} records x {args.points} points ...')
+        # 使用 app 的連線：vin/vout 條件包含 packed 記錄用的 SQL 函式 packed_curve_in_range
+        app.app.config['DB_PATH'] = build_database(root, args.records, args.points)
+        conn = app.connect_db()
+        conn.execute('ANALYZE')
+
+        sql, params = current_query(*RANGES[0])
+        plan = query_plan(conn, sql, params)
+        print('EXPLAIN QUERY PLAN:')
+        for step in plan:
+            print(f'  {step}')
+        # 子查詢必須由覆蓋索引回答，不能掃描 efficiency_table
+        assert any('COVERING INDEX idx_eff_user_vin_vout' in step for step in plan), plan
+        assert not any(step.startswith('SCAN e') for step in plan), plan
+
+        print(f"\n{'range':<28} {'rows':>6} {'exists ms':>10} {'legacy ms':>10} {'exists, no index ms':>20}")
+        results = []
+        for ranges in RANGES:
+            sql, params = current_query(*ranges)
+            results.append(timed(conn, sql, params))
+
+        # 對照組：還原為原本的索引（只有 idx_user_id），量測舊版 JOIN + DISTINCT 與沒有覆蓋索引的 EXISTS
+        conn.execute('DROP INDEX idx_eff_user_vin_vout')
+        for (exists_ms, exists_rows), ranges in zip(results, RANGES):
+            sql, params = current_query(*ranges)
+            legacy_ms, legacy_rows = timed(conn, LEGACY_QUERY, ranges)
+            no_index_ms, _ = timed(conn, sql, params)
+            assert legacy_rows == exists_rows
+            label = 'vin {}-{} vout {}-{}'.format(*ranges)
+            print(f"{label:<28} {exists_rows:>6} {exists_ms:>10.1f} {legacy_ms:>10.1f} {no_index_ms:>20.1f}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+# bench_workers.py - gunicorn 多 worker 部署：吞吐量隨 worker 數的變化，以及上傳通知是否送到每個 worker 的客戶端
+#
+# 以 gunicorn.conf.py 依序啟動 1、2、4 個 worker（使用 SQLite 訊息佇列），多個執行緒在固定時間內持續送出
+# 曲線比較與單筆曲線查詢；之後開啟多條 WebSocket 連線，從另一個共用同一佇列的 gunicorn 行程上傳一筆資料，
+# 確認每條連線都收到通知（連線由哪個 worker 接受無法控制，由另一個行程上傳才能確定通知經過佇列）
+# 用法: python benchmarks/bench_workers.py [--workers 1 2 4 --clients 16 --duration 10]
+import io
+import os
+import csv
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+import http.client
+
+import simple_websocket
+
+from synthetic import ROOT, build_database, synthetic_curve
+
+PORT = 5099
+# 負責上傳的另一個 gunicorn 行程
+UPLOAD_PORT = 5100
+
+
+def start_server(root, db_path, workers, port=PORT):
+    env = dict(os.environ, PORT=str(port), VR_DB_PATH=db_path, VR_WORKERS=str(workers),
+               VR_SOCKETIO_MESSAGE_QUEUE=f'sqlite:///{root}/socketio_queue.sqlite')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if request('GET', '/api/series-numbers', port=port)[0] == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('gunicorn 未能啟動')
+
+
+def request(method, path, body=None, headers=None, port=PORT):
+    # 每個請求使用新連線，與多個瀏覽器同時使用時相同，連線由任一 worker 接受
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def run_load(series_numbers, clients, duration):
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            # 隨機組合避開各 worker 的查詢快取
+            if rng.random() < 0.5:
+                pair = ','.join(str(sn) for sn in rng.sample(series_numbers, 2))
+                path = f'/api/compare?series_numbers={pair}&points={rng.randint(50, 500)}'
+            else:
+                path = f'/api/efficiency-data/{rng.randint(1, len(series_numbers))}?max_points={rng.randint(3, 200)}'
+            start = time.perf_counter()
+            status, _ = request('GET', path)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                errors.append(status)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+class Listener(threading.Thread):
+    # 以 Engine.IO / Socket.IO 協定的文字封包加入 uploads 房間，記錄收到 new_data_uploaded 的時間
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.ready = threading.Event()
+        self.received_at = None
+        self.stop = False
+
+    def run(self):
+        # 偶爾連線建立後收不到 Engine.IO open 封包，重新連線
+        while True:
+            ws = simple_websocket.Client.connect(f'ws://127.0.0.1:{PORT}/socket.io/?EIO=4&transport=websocket')
+            if ws.receive(timeout=3):  # Engine.IO open
+                break
+            ws.close()
+        ws.send('40')
+        ws.receive()  # Socket.IO connect
+        ws.send('42' + json.dumps(['join_room', {'room': 'uploads'}]))
+        while not self.stop:
+            message = ws.receive(timeout=0.5)
+            if message == '2':
+                ws.send('3')
+            elif message and message.startswith('42'):
+                event = json.loads(message[2:])[0]
+                if event == 'joined_room':
+                    self.ready.set()
+                elif event == 'new_data_uploaded' and self.received_at is None:
+                    self.received_at = time.perf_counter()
+        ws.close()
+
+
+def upload_csv(csv_bytes):
+    boundary = uuid.uuid4().hex
+    fields = {'user_name': 'bench', 'pcb_name': 'DB391', 'powerstage_name': 'TDA22594A', 'phase_count': '6',
+              'frequency': '800', 'inductor_value': '100', 'tlvr': 'no', 'imax': '300'}
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+             for name, value in fields.items()]
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="bench.csv"\r\n'
+                 f'Content-Type: text/csv\r\n\r\n'.encode() + csv_bytes + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    status, body = request('POST', '/upload', b''.join(parts),
+                           {'Content-Type': f'multipart/form-data; boundary={boundary}'}, port=UPLOAD_PORT)
+    assert status == 200, body
+
+
+def check_notifications(listeners):
+    threads = [Listener() for _ in range(listeners)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.ready.wait(10)
+    # 新產生的曲線，避免被當成重複上傳
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['Istep', 'Vin', 'Iin', 'Vout', 'remote Vout sense', 'Iout', 'Efficiency', 'Efficiency_remote'])
+    writer.writerows(synthetic_curve(random.Random(), 300, 100))
+    upload_csv(output.getvalue().encode('utf-8'))
+    uploaded_at = time.perf_counter()
+    time.sleep(3)
+    for thread in threads:
+        thread.stop = True
+    delays = [(thread.received_at - uploaded_at) * 1000 for thread in threads if thread.received_at]
+    return len(delays), max(delays) if delays else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--points', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f'building {args.records} records x {args.points} points ...')
+        db_path = build_database(root, args.records, args.points)
+        print(f'CPU cores: {os.cpu_count()}, clients: {args.clients}, {args.duration:g} s per run\n')
+        print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} {'notified':>9} {'notify ms':>10}")
+        for workers in args.workers:
+            process = start_server(root, db_path, workers)
+            uploader = start_server(root, db_path, 1, UPLOAD_PORT)
+            try:
+                series_numbers = json.loads(request('GET', '/api/series-numbers')[1])
+                latencies, errors = run_load(series_numbers, args.clients, args.duration)
+                listeners = 4 * workers
+                notified, delay = check_notifications(listeners)
+            finally:
+                for server in (process, uploader):
+                    server.terminate()
+                    server.wait()
+            quantiles = statistics.quantiles(latencies, n=20)
+            p50, p95 = quantiles[9], quantiles[18]
+            print(f"{workers:>7} {len(latencies) / args.duration:>8.1f} {p50:>8.1f} {p95:>8.1f} {len(errors):>7} "
+                  f"{f'{notified}/{listeners}':>9} {delay if delay is not None else float('nan'):>10.0f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# synthetic.py - 產生符合 init_db 結構的合成效率資料庫，供效能測試使用
+import os
+import sys
+import math
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+POWERSTAGES = ['TDA22594A', 'TDM22545D', 'TDA21490', 'TDA21535', 'MP87670', 'SiC654A']
+PCBS = ['DB391', 'DB402', 'EVB-VR14', 'EVB-VR15', 'SVID-REF']
+VIN_CHOICES = [5.0, 12.0, 48.0]
+VOUT_CHOICES = [0.6, 0.8, 1.0, 1.15, 1.8]
+
+
+def synthetic_curve(rng, imax, points):
+    vin = rng.choice(VIN_CHOICES) * (1 + rng.uniform(-0.002, 0.002))
+    vout = rng.choice(VOUT_CHOICES)
+    peak = rng.uniform(88.0, 94.0)
+    rows = []
+    for k in range(points):
+        istep = imax * k / max(points - 1, 1)
+        iout = max(istep, 0.06)
+        # 輕載效率低、中載最高、重載因導通損失下降
+        efficiency = peak * (1 - math.exp(-iout / (imax * 0.04))) - 6.0 * (iout / imax) ** 2
+        efficiency = max(efficiency, 1.0)
+        iin = vout * iout / (vin * efficiency / 100)
+        rows.append((istep, vin, iin, vout, vout * 0.9997, iout, efficiency, efficiency - 0.01))
+    return rows
+
+
+def populate(conn, records, points, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    cursor = conn.cursor()
+    for n in range(records):
+        imax = rng.choice([40, 60, 80, 120, 200, 300])
+        cursor.execute('''
+            INSERT INTO information_table
+            (user_name, pcb_name, powerstage_name, phase_count, frequency,
+             inductor_value, tlvr, imax, upload_date, notice)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', ('bench', rng.choice(PCBS), rng.choice(POWERSTAGES), rng.choice([1, 2, 4, 6, 8]),
+              rng.choice([400, 600, 800, 1000]), rng.choice([65, 100, 150, 220]),
+              rng.choice(['yes', 'no']), imax, (start + timedelta(minutes=n)).isoformat(), ''))
+        user_id = cursor.lastrowid
+        cursor.executemany('''
+            INSERT INTO efficiency_table
+            (istep, vin, iin, vout, remote_vout_sense, iout, efficiency, efficiency_remote, user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [row + (user_id,) for row in synthetic_curve(rng, imax, points)])
+    # 與上傳流程相同：series_number 為該筆記錄第一個量測點的序號
+    cursor.execute('''
+        UPDATE information_table
+        SET series_number = (SELECT MIN(series_number) FROM efficiency_table e WHERE e.user_id = information_table.user_ID)
+        WHERE series_number IS NULL
+    ''')
+    conn.commit()
+
+
+# 在 root 目錄下建立 data/vr_efficiency.sqlite（沿用 app.init_db 的資料表結構），並設為 app 使用的資料庫
+def build_database(root, records, points, seed=0):
+    import app
+    db_path = os.path.join(root, 'data', 'vr_efficiency.sqlite')
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    app.app.config['DB_PATH'] = db_path
+    app.init_db()
+    conn = sqlite3.connect(db_path)
+    populate(conn, records, points, seed)
+    conn.close()
+    # 再次執行 init_db 以補齊曲線摘要
+    app.init_db()
+    return db_path
@@ -0,0 +1,24 @@
+# gunicorn.conf.py - 多行程（多 worker）部署設定
+#
+# 用法: gunicorn -c gunicorn.conf.py app:app
+# 每個 worker 是獨立的 eventlet 行程；worker 之間的 Socket.IO 事件經由 VR_SOCKETIO_MESSAGE_QUEUE 轉送
+import os
+import sys
+import subprocess
+import multiprocessing
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+worker_class = 'eventlet'
+workers = int(os.environ.get('VR_WORKERS', multiprocessing.cpu_count()))
+# 大型還原、匯出在同一個 worker 中執行，避免被當成沒有回應而重新啟動
+timeout = int(os.environ.get('VR_WORKER_TIMEOUT', 300))
+
+# 多個 worker 且未指定訊息佇列時，使用 data/ 下的 SQLite 佇列（必須在 worker 載入 app 之前設定）
+if workers > 1:
+    os.environ.setdefault('VR_SOCKETIO_MESSAGE_QUEUE', 'sqlite:///' + os.path.join('data', 'socketio_queue.sqlite'))
+
+
+def on_starting(server):
+    # 在啟動任何 worker 之前建立資料表、索引與曲線摘要一次，worker 不再各自執行（也不會同時搶寫入鎖）
+    # 以子行程執行：不在 master 中 import app，eventlet 需要在 import 之前 monkey patch，且佇列的 host_id 必須每個 worker 不同
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], check=True)